@@ -0,0 +1,194 @@
+#! /usr/bin/env python3
+"""
+Benchmark of the code generated by MiniCC: for each allocator, with and
+without SSA (minimal, semi-pruned, pruned, built during code generation,
+exited with coalescing, and with SSA optimisations),
+measure the dynamic instruction count, loads, stores and static code size
+with RiscVSimulator.py, the compile time, the number of phi nodes and of
+moves left after exiting SSA.
+Usage:
+    python3 MiniCBench.py [--output bench.json] [files.c ...]
+    python3 MiniCBench.py --baseline bench_baseline.json [--threshold 0.05]
+    python3 MiniCBench.py --help
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import MiniCC
+from Errors import AllocationError, MiniCRuntimeError
+from OutputChannel import OutputChannel
+from RiscVSimulator import RiscVSimulator
+from test_expect_pragma import TestExpectPragmas
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+
+DEFAULT_FILES = (glob.glob(os.path.join(HERE, 'TP04/tests/provided/**/[a-zA-Z]*.c'), recursive=True)
+                 + glob.glob(os.path.join(HERE, 'TP05/tests/provided/**/*.c'), recursive=True)
+                 + glob.glob(os.path.join(HERE, 'benchmarks/*.c')))
+
+ALLOCATORS = ['naive', 'all_in_mem', 'smart']
+# SSA level: (name, enable_ssa, ssa_optims, ssa_mode, ssa_coalescing)
+SSA_LEVELS = [('none', False, False, 'minimal', False),
+              ('ssa', True, False, 'minimal', False),
+              ('ssa-semi-pruned', True, False, 'semi-pruned', False),
+              ('ssa-pruned', True, False, 'pruned', False),
+              ('ssa-on-the-fly', True, False, 'on-the-fly', False),
+              ('ssa-coalescing', True, False, 'minimal', True),
+              ('ssa-optim', True, True, 'minimal', False)]
+
+# Metrics of the generated code, compared with the threshold
+COST_METRICS = ['instructions', 'loads', 'stores', 'code_size']
+# Compile time differences below this (in seconds) are noise
+TIME_NOISE = 0.005
+
+
+def compile_file(filename, output_name, alloc, ssa, optim, mode, coalescing,
+                 repeat):
+    """Compile with MiniCC.main, in-process. Return the best compile time,
+    and the statistics of MiniCC.main."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = MiniCC.main(filename, alloc, enable_ssa=ssa,
+                                output_name=output_name, ssa_optims=optim,
+                                ssa_mode=mode, ssa_coalescing=coalescing)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, stats
+
+
+def bench_variant(filename, expect, alloc, ssa, optim, mode, coalescing,
+                  repeat):
+    """Compile and simulate one variant, return its record."""
+    record = {'status': 'ok'}
+    with tempfile.TemporaryDirectory() as tmp:
+        output_name = os.path.join(tmp, 'out.s')
+        try:
+            record['compile_time'], stats = compile_file(
+                filename, output_name, alloc, ssa, optim, mode, coalescing,
+                repeat)
+            record['phis'] = stats['phis']
+            record['moves'] = stats['moves']
+        except AllocationError:
+            return {'status': 'skipped'}
+        except (Exception, SystemExit) as e:
+            return {'status': 'error', 'message': repr(e)}
+        with open(output_name) as f:
+            text = f.read()
+    output = OutputChannel.capture()
+    try:
+        sim = RiscVSimulator(text, output=output)
+        execcode = sim.run()
+    except MiniCRuntimeError as e:
+        return {'status': 'error', 'message': str(e)}
+    loads, stores = sim.loads_stores()
+    record.update(instructions=sim.steps, loads=loads, stores=stores,
+                  code_size=sim.code_size())
+    if output.getvalue() != expect.output or execcode != expect.execcode:
+        record['status'] = 'wrong'
+    return record
+
+
+def run_benchmarks(files, allocators, repeat):
+    expects = TestExpectPragmas()
+    results = dict()
+    for filename in sorted(files):
+        expect = expects.get_expect(filename)
+        if expect.exitcode != 0 or expect.linkargs:
+            continue  # Not a valid standalone program
+        name = os.path.relpath(filename, HERE)
+        for alloc in allocators:
+            for level, ssa, optim, mode, coalescing in SSA_LEVELS:
+                key = '{}:{}:{}'.format(name, alloc, level)
+                results[key] = bench_variant(filename, expect, alloc, ssa, optim,
+                                             mode, coalescing, repeat)
+    return results
+
+
+def print_table(results, stream=sys.stdout):
+    header = ('program', 'alloc', 'ssa', 'instrs', 'loads', 'stores',
+              'size', 'phis', 'moves', 'compile ms', 'status')
+    rows = []
+    for key, r in results.items():
+        program, alloc, level = key.split(':')
+        if r['status'] in ('ok', 'wrong'):
+            rows.append((program, alloc, level, r['instructions'], r['loads'],
+                         r['stores'], r['code_size'], r.get('phis', '-'),
+                         r.get('moves', '-'), '{:.1f}'.format(1000 * r['compile_time']), r['status']))
+        else:
+            rows.append((program, alloc, level) + ('-',) * 7 + (r['status'],))
+    widths = [max(len(str(x)) for x in col) for col in zip(header, *rows)]
+    for row in [header] + rows:
+        print('  '.join(str(x).ljust(w) for x, w in zip(row, widths)).rstrip(),
+              file=stream)
+
+
+def check_regressions(results, baseline, threshold, time_threshold):
+    """Compare with the baseline, return the list of regressions."""
+    regressions = []
+    for key, old in baseline.items():
+        new = results.get(key)
+        if new is None:
+            continue
+        if old['status'] == 'ok' and new['status'] != 'ok':
+            regressions.append('{}: status {} (was ok)'.format(key, new['status']))
+            continue
+        if new['status'] != 'ok':
+            continue
+        for metric in COST_METRICS:
+            if new[metric] > old[metric] * (1 + threshold):
+                regressions.append('{}: {} {} -> {}'.format(
+                    key, metric, old[metric], new[metric]))
+        old_t, new_t = old['compile_time'], new['compile_time']
+        if new_t > old_t * (1 + time_threshold) and new_t - old_t > TIME_NOISE:
+            regressions.append('{}: compile time {:.1f}ms -> {:.1f}ms'.format(
+                key, 1000 * old_t, 1000 * new_t))
+    return regressions
+
+
+# command line management
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the generated code')
+    parser.add_argument('files', type=str, nargs='*',
+                        help='Source files (default: TP04, TP05 tests and benchmarks/)')
+    parser.add_argument('--reg-alloc', type=str, action='append',
+                        choices=ALLOCATORS,
+                        help='Allocations to benchmark (default: all)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Compile each variant n times, keep the best time')
+    parser.add_argument('--output', type=str,
+                        help='Write the results as JSON (usable as a baseline)')
+    parser.add_argument('--baseline', type=str,
+                        help='Fail if the results are worse than this JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.05,
+                        help='Tolerated relative increase of the generated code cost')
+    parser.add_argument('--time-threshold', type=float, default=0.5,
+                        help='Tolerated relative increase of the compile time')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.files or DEFAULT_FILES,
+                             args.reg_alloc or ALLOCATORS, args.repeat)
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print("Results written in " + args.output)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = check_regressions(results, baseline,
+                                        args.threshold, args.time_threshold)
+        for r in regressions:
+            print("REGRESSION " + r)
+        if regressions:
+            exit(1)
+        print("No regression with respect to " + args.baseline)
@@ -27,7 +27,15 @@ try:  # Liveness for TP05 (M1IF08)
 except ModuleNotFoundError:
     pass
 try:  # SSA for TP05a (CAP)
-    from TP05.SSA import (enter_ssa, exit_ssa)  # type: ignore[import]
+    from TP05.SSA import (enter_ssa, exit_ssa, count_phis, count_moves)  # type: ignore[import]
+except ModuleNotFoundError:
+    pass
+try:  # Out-of-SSA translation with coalescing (CAP)
+    from TP05.SSACoalescing import exit_ssa_coalescing  # type: ignore[import]
+except ModuleNotFoundError:
+    pass
+try:  # Check of the SSA form (CAP)
+    from TP05.SSAVerifier import verify_ssa  # type: ignore[import]
 except ModuleNotFoundError:
     pass
 try:  # Liveness for TP05b (CAP)
@@ -66,8 +74,14 @@ class CountErrorListener(ErrorListener):
 
 def main(inputname, reg_alloc, enable_ssa=False,
          typecheck=True, typecheck_only=False, stdout=False, output_name=None, debug=False,
-         debug_graphs=False, ssa_graphs=False, ssa_optims=False):
+         debug_graphs=False, ssa_graphs=False, ssa_optims=False,
+         asm_comments=True, ssa_mode="minimal", ssa_coalescing=False,
+         ssa_verify=False):
+    """Compile inputname. Return statistics on the compilation: the
+    number of phi nodes inserted ('phis'), and of moves between
+    temporaries left after exiting SSA ('moves')."""
     (basename, rest) = os.path.splitext(inputname)
+    stats = {'phis': 0, 'moves': 0}
     if not typecheck_only:
         if stdout:
             output_name = None
@@ -97,10 +111,12 @@ def main(inputname, reg_alloc, enable_ssa=False,
     if typecheck_only:
         if debug:
             print("Not running code generation because of --typecheck-only.")
-        return
+        return stats
 
-    # Codegen 3@ CFG Visitor, first argument is debug mode
-    visitor3 = MiniCCodeGen3AVisitor(debug, parser)
+    # Codegen 3@ CFG Visitor, first argument is debug mode. With the
+    # on-the-fly mode, it generates SSA code directly.
+    ssa_codegen = enable_ssa and ssa_mode == "on-the-fly"
+    visitor3 = MiniCCodeGen3AVisitor(debug, parser, ssa=ssa_codegen)
 
     # dump generated code on stdout or file.
     with open(output_name, 'w') if output_name else sys.stdout as output:
@@ -108,18 +124,28 @@ def main(inputname, reg_alloc, enable_ssa=False,
         for function in visitor3.get_functions():
             # Allocation part
             cfg = CFG(function)
+            # Comments of rewritten instructions are always kept in debug mode
+            cfg.set_asm_comments(asm_comments or debug)
             if debug_graphs:
                 s = "{}.{}.dot".format(basename, cfg._name)
                 print("Output", s)
                 cfg.print_dot(s)
             if enable_ssa:
-                DF = enter_ssa(cfg, basename, debug, ssa_graphs)
+                DF = None
+                if not ssa_codegen:
+                    DF = enter_ssa(cfg, basename, debug, ssa_graphs, ssa_mode)
+                if ssa_verify:
+                    verify_ssa(cfg, "SSA code generation" if ssa_codegen
+                               else "enter_ssa")
+                stats['phis'] += count_phis(cfg)
                 if ssa_graphs:
                     s = "{}.{}.ssa.dot".format(basename, cfg._name)
                     print("Output", s)
                     cfg.print_dot(s, DF, True)
                 if ssa_optims:
                     OptimSSA(cfg, debug=debug)
+                    if ssa_verify:
+                        verify_ssa(cfg, "OptimSSA")
                     if ssa_graphs:
                         s = "{}.{}.optimssa.dot".format(basename, cfg._name)
                         print("Output", s)
@@ -133,7 +159,7 @@ def main(inputname, reg_alloc, enable_ssa=False,
                 comment = "all-in-memory allocation"
             elif reg_alloc == "smart":
                 liveness = None
-                if enable_ssa:
+                if enable_ssa and not ssa_coalescing:
                     try:
                         liveness = LivenessSSA(cfg, debug=debug)
                     except NameError:
@@ -154,10 +180,24 @@ liveness file not found for {}.".format(form))
                 comment = "non executable 3-Address instructions"
             else:
                 raise ValueError("Invalid allocation strategy:" + reg_alloc)
+            # Only the smart allocation works on the SSA form. The others
+            # allocate after exit_ssa, so that they see the temporary it
+            # may add to sequentialize the moves of the phis, and so do
+            # all of them with exit_ssa_coalescing, which renames the
+            # temporaries.
+            exit_ssa_first = enable_ssa and (reg_alloc != "smart"
+                                             or ssa_coalescing)
+            if exit_ssa_first:
+                if ssa_coalescing:
+                    exit_ssa_coalescing(cfg, debug=debug)
+                else:
+                    exit_ssa(cfg)
             if allocator:
                 allocator.prepare()
             if enable_ssa:
-                exit_ssa(cfg)
+                if not exit_ssa_first:
+                    exit_ssa(cfg)
+                stats['moves'] += count_moves(cfg)
                 comment += " with SSA"
             if allocator:
                 allocator.rewriteCode(cfg)
@@ -168,6 +208,7 @@ liveness file not found for {}.".format(form))
             cfg.print_code(output, comment=comment)
             if debug:
                 visitor3.printSymbolTable()
+    return stats
 
 
 # command line management
@@ -182,9 +223,27 @@ if __name__ == '__main__':
     parser.add_argument('--ssa', action='store_true',
                         default=False,
                         help='Enable SSA form')
+    parser.add_argument('--ssa-mode', type=str,
+                        choices=['minimal', 'semi-pruned', 'pruned',
+                                 'on-the-fly'],
+                        help='Where to insert phi nodes: at the iterated \
+dominance frontiers of the definitions (minimal, the default), only for \
+variables used in several blocks (semi-pruned), or only where the variable \
+is live (pruned); or build SSA during code generation, without dominance \
+(on-the-fly). Implies --ssa')
+    parser.add_argument('--ssa-coalescing', action='store_true',
+                        default=False,
+                        help='Exit SSA by coalescing the variables of the \
+phi nodes that do not interfere, instead of a move per argument. Implies \
+--ssa')
     parser.add_argument('--ssa-optim', action='store_true',
                         default=False,
                         help='Enable SSA optimizations')
+    parser.add_argument('--verify-ssa', action='store_true',
+                        default=False,
+                        help='Check the SSA form (single definitions, phi \
+operands, definitions dominating their uses) after entering it and after \
+each SSA pass, in linear time')
     parser.add_argument('--stdout', action='store_true',
                         help='Generate code to stdout')
     parser.add_argument('--debug', action='store_true',
@@ -204,21 +263,39 @@ if __name__ == '__main__':
                         help="Run only the typechecker, don't try generating code.")
     parser.add_argument('--output', type=str,
                         help='Generate code to outfile')
+    parser.add_argument('--stats', action='store_true',
+                        default=False,
+                        help='Print statistics on the compilation (number \
+of phi nodes and of moves left after exiting SSA) on stderr')
+    parser.add_argument('--no-asm-comments', action='store_true',
+                        default=False,
+                        help="Don't comment the rewritten instructions in the \
+generated code (they are kept with --debug)")
 
     args = parser.parse_args()
 
     if args.reg_alloc is None and not args.typecheck_only:
         print("error: the following arguments is required: --reg-alloc")
         exit(1)
-    if not args.ssa and args.ssa_optim:
+    enable_ssa = (args.ssa or args.ssa_mode is not None
+                  or args.ssa_coalescing)
+    if not enable_ssa and args.ssa_optim:
         print("error: SSA is needed for optimizations")
         exit(1)
+    if not enable_ssa and args.verify_ssa:
+        print("error: SSA is needed for --verify-ssa")
+        exit(1)
 
     try:
-        main(args.filename, args.reg_alloc, args.ssa,
-             not args.disable_typecheck, args.typecheck_only,
-             args.stdout, args.output, args.debug,
-             args.graphs, args.ssa_graphs, args.ssa_optim)
+        stats = main(args.filename, args.reg_alloc, enable_ssa,
+                     not args.disable_typecheck, args.typecheck_only,
+                     args.stdout, args.output, args.debug,
+                     args.graphs, args.ssa_graphs, args.ssa_optim,
+                     not args.no_asm_comments, args.ssa_mode or "minimal",
+                     args.ssa_coalescing, args.verify_ssa)
+        if args.stats:
+            print("phis: {}".format(stats['phis']), file=sys.stderr)
+            print("moves: {}".format(stats['moves']), file=sys.stderr)
     except MiniCUnsupportedError as e:
         print(e)
         exit(5)
@@ -0,0 +1,173 @@
+#! /usr/bin/env python3
+"""
+Generator of random, valid and well-typed MiniC programs of tunable size,
+for compiler stress tests and benchmarks.
+Usage:
+    python3 MiniCGenerator.py [--seed n] [--statements n] [--depth n] ... > prog.c
+    python3 MiniCGenerator.py --help
+"""
+
+import argparse
+import random
+from typing import List
+
+
+class MiniCGenerator:
+    """Seeded generator of MiniC programs.
+
+    - statements: approximate number of statements of the program;
+    - depth: maximal nesting depth of if/while statements;
+    - expr_depth: maximal depth of expressions;
+    - variables: number of int variables (plus a few bool variables);
+    - live: number of variables kept live during the whole program (they
+      are used in expressions everywhere and printed at the end).
+
+    Programs always terminate: each while loop has its own counter, which
+    is only modified by the loop itself. Divisions and modulos are only by
+    non-zero literals.
+    """
+
+    def __init__(self, seed=0, statements=100, depth=3, expr_depth=3,
+                 variables=10, live=4, loop_bound=4):
+        self._rand = random.Random(seed)
+        self._statements = statements
+        self._depth = depth
+        self._expr_depth = expr_depth
+        self._loop_bound = loop_bound
+        self._ints = ["x{}".format(i) for i in range(max(variables, 1))]
+        self._bools = ["b{}".format(i) for i in range(max(variables // 4, 1))]
+        self._live = self._ints[:min(live, len(self._ints))]
+        self._counters: List[str] = []
+        self._budget = 0
+        self._lines: List[str] = []
+
+    # Expressions
+
+    def int_expr(self, depth: int) -> str:
+        r = self._rand
+        if depth <= 0 or r.random() < 0.25:
+            if r.random() < 0.3:
+                return str(r.randint(0, 100))
+            if self._live and r.random() < 0.5:
+                return r.choice(self._live)
+            return r.choice(self._ints)
+        kind = r.random()
+        if kind < 0.1:
+            return "-({})".format(self.int_expr(depth - 1))
+        if kind < 0.25:
+            op = r.choice(["/", "%"])
+            return "({}) {} {}".format(self.int_expr(depth - 1), op, r.randint(1, 9))
+        op = r.choice(["+", "-", "*", "+", "-"])
+        return "({}) {} ({})".format(self.int_expr(depth - 1), op,
+                                     self.int_expr(depth - 1))
+
+    def bool_expr(self, depth: int) -> str:
+        r = self._rand
+        if depth <= 0 or r.random() < 0.3:
+            if r.random() < 0.2:
+                return r.choice(["true", "false", r.choice(self._bools)])
+            op = r.choice(["<", "<=", ">", ">=", "==", "!="])
+            return "({}) {} ({})".format(self.int_expr(depth - 1), op,
+                                         self.int_expr(depth - 1))
+        kind = r.random()
+        if kind < 0.2:
+            return "!({})".format(self.bool_expr(depth - 1))
+        op = r.choice(["&&", "||"])
+        return "({}) {} ({})".format(self.bool_expr(depth - 1), op,
+                                     self.bool_expr(depth - 1))
+
+    # Statements
+
+    def emit(self, indent: int, line: str) -> None:
+        self._lines.append("    " * indent + line)
+
+    def statement(self, indent: int, depth: int) -> None:
+        r = self._rand
+        self._budget -= 1
+        kind = r.random()
+        if depth > 0 and kind < 0.15:
+            self.emit(indent, "if ({}) {{".format(self.bool_expr(self._expr_depth)))
+            self.block(indent + 1, depth - 1)
+            if r.random() < 0.5:
+                self.emit(indent, "} else {")
+                self.block(indent + 1, depth - 1)
+            self.emit(indent, "}")
+        elif depth > 0 and kind < 0.25:
+            counter = "c{}".format(len(self._counters))
+            self._counters.append(counter)
+            self.emit(indent, "{} = 0;".format(counter))
+            self.emit(indent, "while ({} < {}) {{".format(counter, r.randint(1, self._loop_bound)))
+            self.block(indent + 1, depth - 1)
+            self.emit(indent + 1, "{0} = {0} + 1;".format(counter))
+            self.emit(indent, "}")
+        elif kind < 0.32:
+            self.emit(indent, "{} = {};".format(r.choice(self._bools),
+                                                self.bool_expr(self._expr_depth)))
+        elif kind < 0.37:
+            self.emit(indent, "println_int({});".format(self.int_expr(self._expr_depth)))
+        else:
+            # Keep the values small, to avoid overflows.
+            self.emit(indent, "{} = ({}) % 1000;".format(r.choice(self._ints),
+                                                          self.int_expr(self._expr_depth)))
+
+    def block(self, indent: int, depth: int) -> None:
+        n = self._rand.randint(1, 4)
+        for _ in range(n):
+            if self._budget <= 0:
+                break
+            self.statement(indent, depth)
+
+    def generate(self) -> str:
+        """Return the text of a new program."""
+        self._lines = []
+        self._counters = []
+        self._budget = self._statements
+        while self._budget > 0:
+            self.statement(1, self._depth)
+        # Declarations depend on the loops generated in the body.
+        body = self._lines
+        self._lines = []
+        self.emit(0, '#include "printlib.h"')
+        self.emit(0, "")
+        self.emit(0, "int main() {")
+        self.emit(1, "int {};".format(", ".join(self._ints)))
+        if self._counters:
+            self.emit(1, "int {};".format(", ".join(self._counters)))
+        self.emit(1, "bool {};".format(", ".join(self._bools)))
+        for i, v in enumerate(self._live):
+            self.emit(1, "{} = {};".format(v, i + 1))
+        self._lines += body
+        for v in self._live:
+            self.emit(1, "println_int({});".format(v))
+        self.emit(1, "return 0;")
+        self.emit(0, "}")
+        return "\n".join(self._lines) + "\n"
+
+
+# command line management
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a random MiniC program')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed')
+    parser.add_argument('--statements', type=int, default=100,
+                        help='Number of statements')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='Maximal nesting depth of if/while')
+    parser.add_argument('--expr-depth', type=int, default=3,
+                        help='Maximal depth of expressions')
+    parser.add_argument('--variables', type=int, default=10,
+                        help='Number of int variables')
+    parser.add_argument('--live', type=int, default=4,
+                        help='Number of values live across the whole program')
+    parser.add_argument('--output', type=str,
+                        help='Write the program to outfile')
+    args = parser.parse_args()
+
+    gen = MiniCGenerator(args.seed, args.statements, args.depth,
+                         args.expr_depth, args.variables, args.live)
+    text = gen.generate()
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text, end='')
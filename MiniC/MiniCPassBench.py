@@ -0,0 +1,288 @@
+#! /usr/bin/env python3
+"""
+Scaling benchmark of the compiler passes: time each pass of MiniCC on
+programs of growing size produced by MiniCGenerator.py, and estimate the
+growth of each pass (log-log slope), to spot super-linear passes.
+With --memory, also measure the memory used per 3-address instruction.
+With --dominators, time the dominator algorithms on synthetic CFGs.
+Usage:
+    python3 MiniCPassBench.py [--sizes 100,200,400,800] [--seed n] ...
+    python3 MiniCPassBench.py --memory --sizes 5000
+    python3 MiniCPassBench.py --dominators --sizes 1000,4000,16000
+    python3 MiniCPassBench.py --help
+"""
+
+import argparse
+import gc
+import math
+import random
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from antlr4 import InputStream, CommonTokenStream
+from MiniCLexer import MiniCLexer
+from MiniCParser import MiniCParser
+from MiniCGenerator import MiniCGenerator
+from TP03.MiniCTypingVisitor import MiniCTypingVisitor
+from TP04.MiniCCodeGen3AVisitor import MiniCCodeGen3AVisitor
+from TP04.APIRiscV import LinearCode
+from TP04.Operands import Condition, Immediate
+from TP04.PackedInstructions import PackedInstructions
+from TP05.CFG import CFG
+from TP05.Dominance import (computeIdom, DominatorTree,
+                            CHK, SEMI_NCA)
+from TP05.SSA import (insertPhis, rename_variables, exit_ssa)
+from TP05.LivenessSSA import LivenessSSA
+from TP05.SmartAllocation import SmartAllocator
+
+PASSES = ['parse', 'typecheck', 'codegen', 'cfg', 'dominators', 'dom_tree',
+          'dom_frontier', 'phis', 'rename', 'liveness', 'interference',
+          'coloring', 'exit_ssa', 'rewrite']
+
+# A pass whose time grows faster than size^SUPERLINEAR is reported
+SUPERLINEAR = 1.3
+
+
+class PassTimer:
+    """Time the passes in order, stop at the first unimplemented one."""
+
+    def __init__(self):
+        self.times: Dict[str, Optional[float]] = {p: None for p in PASSES}
+
+    def __call__(self, name, f, *args):
+        start = time.perf_counter()
+        res = f(*args)
+        self.times[name] = time.perf_counter() - start
+        return res
+
+
+def parse(text: str):
+    parser = MiniCParser(CommonTokenStream(MiniCLexer(InputStream(text))))
+    return parser, parser.prog()
+
+
+def time_passes(text: str):
+    """Compile text with SSA and the smart allocator, return the time of
+    each pass (None if not run) and the number of 3-address instructions."""
+    timer = PassTimer()
+    size = 0
+    try:
+        parser, tree = timer('parse', parse, text)
+        timer('typecheck', MiniCTypingVisitor().visit, tree)
+        visitor3 = MiniCCodeGen3AVisitor(False, parser)
+        timer('codegen', visitor3.visit, tree)
+        function = visitor3.get_functions()[0]
+        size = len(function.get_instructions())
+        cfg = timer('cfg', CFG, function)
+        idom = timer('dominators', computeIdom, cfg)
+        dominators = timer('dom_tree', DominatorTree, cfg, idom)
+        DT = dominators.get_DT()
+        DF = timer('dom_frontier', dominators.frontiers)
+        timer('phis', insertPhis, cfg, DF)
+        timer('rename', rename_variables, cfg, DT)
+        liveness = LivenessSSA(cfg)
+        timer('liveness', liveness.run)
+        allocator = SmartAllocator(cfg, "bench", liveness)
+        timer('interference', allocator.build_interference_graph)
+        timer('coloring', allocator.smart_alloc, "bench_colored.dot")
+        timer('exit_ssa', exit_ssa, cfg)
+        timer('rewrite', allocator.rewriteCode, cfg)
+    except NotImplementedError:
+        pass  # Skeleton not completed yet: keep the passes measured so far.
+    return timer.times, size
+
+
+def measure_memory(text: str):
+    """Return the number of 3-address instructions generated for text, and
+    the memory allocated per instruction by the code generation
+    (LinearCode), by the CFG construction, and by the packed storage of
+    the instructions (PackedInstructions)."""
+    parser, tree = parse(text)
+    MiniCTypingVisitor().visit(tree)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        visitor3 = MiniCCodeGen3AVisitor(False, parser)
+        visitor3.visit(tree)
+        function = visitor3.get_functions()[0]
+        linear = tracemalloc.get_traced_memory()[0]
+        # Keep references to measure the objects while they are alive
+        cfg_code = CFG(function)
+        cfg = tracemalloc.get_traced_memory()[0] - linear
+        packed_code = PackedInstructions(function.get_instructions())
+        packed = tracemalloc.get_traced_memory()[0] - linear - cfg
+        del cfg_code, packed_code
+    finally:
+        tracemalloc.stop()
+    size = len(function.get_instructions())
+    return size, linear / size, cfg / size, packed / size
+
+
+def ladder_cfg(n: int, seed: int) -> CFG:
+    """n if/else in sequence: a dominator tree of depth n."""
+    code = LinearCode('ladder')
+    v = code.new_tmp()
+    code.add_instruction_LI(v, 0)
+    for _ in range(n):
+        lbl_else, lbl_end = code.new_label('else'), code.new_label('end_if')
+        code.add_instruction_cond_JUMP(lbl_else, v, Condition('beq'), 0)
+        code.add_instruction_ADD(v, v, Immediate(1))
+        code.add_instruction_JUMP(lbl_end)
+        code.add_label(lbl_else)
+        code.add_instruction_ADD(v, v, Immediate(2))
+        code.add_label(lbl_end)
+    return CFG(code)
+
+
+def nest_cfg(n: int, seed: int) -> CFG:
+    """n nested while loops."""
+    code = LinearCode('nest')
+    v = code.new_tmp()
+    code.add_instruction_LI(v, 0)
+    loops = [(code.new_label('test_while'), code.new_label('end_while'))
+             for _ in range(n)]
+    for lbl_test, lbl_end in loops:
+        code.add_label(lbl_test)
+        code.add_instruction_cond_JUMP(lbl_end, v, Condition('beq'), 0)
+    code.add_instruction_ADD(v, v, Immediate(1))
+    for lbl_test, lbl_end in reversed(loops):
+        code.add_instruction_JUMP(lbl_test)
+        code.add_label(lbl_end)
+    return CFG(code)
+
+
+def gotos_cfg(n: int, seed: int) -> CFG:
+    """n blocks, each ending with a CondJump to a random block: many loops
+    with several entries (irreducible)."""
+    rand = random.Random(seed)
+    code = LinearCode('gotos')
+    v = code.new_tmp()
+    code.add_instruction_LI(v, 0)
+    labels = [code.new_label('goto') for _ in range(n)]
+    for lbl in labels:
+        code.add_label(lbl)
+        code.add_instruction_ADD(v, v, Immediate(1))
+        code.add_instruction_cond_JUMP(rand.choice(labels), v, Condition('beq'), 0)
+    return CFG(code)
+
+
+CFG_SHAPES = {'ladder': ladder_cfg, 'nest': nest_cfg, 'gotos': gotos_cfg}
+
+
+def time_dominators(sizes: List[int], seed: int) -> List[str]:
+    """Print the time of each dominator algorithm on each CFG shape.
+    Return the list of super-linear (shape, algorithm)."""
+    print('{:20}'.format('size') + ''.join('{:>10}'.format(s) for s in sizes)
+          + '{:>8}'.format('slope'))
+    superlinear = []
+    for shape, make_cfg in CFG_SHAPES.items():
+        cfgs = [make_cfg(n, seed) for n in sizes]
+        blocks = [cfg.nb_blocks() for cfg in cfgs]
+        for cfg in cfgs:
+            cfg.dfs_tree()  # Shared by the algorithms, not timed
+        for algorithm in (CHK, SEMI_NCA):
+            times: List[Optional[float]] = []
+            for cfg in cfgs:
+                gc.collect()
+                start = time.perf_counter()
+                computeIdom(cfg, algorithm)
+                times.append(time.perf_counter() - start)
+            name = '{} {}'.format(shape, algorithm)
+            k = slope(blocks, times)
+            mark = ''
+            if k is not None and k > SUPERLINEAR:
+                superlinear.append(name)
+                mark = ' <- super-linear'
+            print('{:20}'.format(name)
+                  + ''.join('{:>10.1f}'.format(1000 * t) for t in times)  # type: ignore
+                  + '{:>8}'.format('-' if k is None else '{:.2f}'.format(k)) + mark)
+    return superlinear
+
+
+def slope(sizes: List[int], times: List[Optional[float]]) -> Optional[float]:
+    """Least-squares slope of log(time) against log(size)."""
+    points = [(math.log(s), math.log(t)) for s, t in zip(sizes, times)
+              if t is not None and t > 0 and s > 0]
+    if len(points) < 2:
+        return None
+    mx = sum(x for x, _ in points) / len(points)
+    my = sum(y for _, y in points) / len(points)
+    den = sum((x - mx) ** 2 for x, _ in points)
+    if den == 0:
+        return None
+    return sum((x - mx) * (y - my) for x, y in points) / den
+
+
+def run(sizes, seed, depth, expr_depth, variables, live):
+    results = []
+    for statements in sizes:
+        text = MiniCGenerator(seed, statements, depth, expr_depth,
+                              variables, live).generate()
+        times, size = time_passes(text)
+        results.append((statements, size, times))
+    return results
+
+
+def print_report(results) -> List[str]:
+    """Print a table pass x size (in ms) with the growth of each pass.
+    Return the list of super-linear passes."""
+    sizes = [size for _, size, _ in results]
+    print('{:14}'.format('instructions') + ''.join('{:>10}'.format(s) for s in sizes)
+          + '{:>8}'.format('slope'))
+    superlinear = []
+    for p in PASSES:
+        times = [t[p] for _, _, t in results]
+        if all(t is None for t in times):
+            continue
+        cells = ''.join('{:>10}'.format('-' if t is None else '{:.1f}'.format(1000 * t))
+                        for t in times)
+        k = slope(sizes, times)
+        mark = ''
+        if k is not None and k > SUPERLINEAR:
+            superlinear.append(p)
+            mark = ' <- super-linear'
+        print('{:14}'.format(p) + cells
+              + '{:>8}'.format('-' if k is None else '{:.2f}'.format(k)) + mark)
+    return superlinear
+
+
+# command line management
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time each compiler pass against program size')
+    parser.add_argument('--sizes', type=str, default='100,200,400,800',
+                        help='Comma-separated numbers of statements')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed of the generator')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='Maximal nesting depth of if/while')
+    parser.add_argument('--expr-depth', type=int, default=2,
+                        help='Maximal depth of expressions')
+    parser.add_argument('--variables', type=int, default=10,
+                        help='Number of int variables')
+    parser.add_argument('--live', type=int, default=4,
+                        help='Number of values live across the whole program')
+    parser.add_argument('--memory', action='store_true',
+                        help='Measure the memory per instruction instead of the time')
+    parser.add_argument('--dominators', action='store_true',
+                        help='Time the dominator algorithms on synthetic CFGs '
+                        '(ladders, nests, gotos) of the given numbers of blocks')
+    args = parser.parse_args()
+
+    if args.dominators:
+        time_dominators([int(s) for s in args.sizes.split(',')], args.seed)
+        exit(0)
+
+    if args.memory:
+        print('{:>12}{:>16}{:>16}{:>18}'.format('instructions', 'code B/instr',
+                                                'CFG B/instr', 'packed B/instr'))
+        for statements in args.sizes.split(','):
+            text = MiniCGenerator(args.seed, int(statements), args.depth, args.expr_depth,
+                                  args.variables, args.live).generate()
+            size, linear, cfg, packed = measure_memory(text)
+            print('{:>12}{:>16.1f}{:>16.1f}{:>18.1f}'.format(size, linear, cfg, packed))
+        exit(0)
+
+    results = run([int(s) for s in args.sizes.split(',')], args.seed,
+                  args.depth, args.expr_depth, args.variables, args.live)
+    print_report(results)
@@ -0,0 +1,64 @@
+import io
+import sys
+
+"""
+MIF08, CAP, buffered output for the println_* builtins.
+Shared by the interpreters and simulators so that printing does not
+cost one write per call.
+"""
+
+
+class OutputChannel:
+    """Buffered output channel.
+
+    Text written with println/write is kept in memory and written to the
+    underlying stream in one go, either when the buffer is full or when
+    flush() is called explicitly (at program exit and before reporting a
+    runtime error, so that the output and the error stay in order).
+
+    With stream=None, the channel works in capture mode: nothing is ever
+    written, and the whole output can be read back with getvalue().
+    """
+
+    def __init__(self, stream=None, bufsize=4096):
+        self._stream = stream
+        self._bufsize = bufsize
+        self._chunks = []
+        self._captured = io.StringIO() if stream is None else None
+
+    @classmethod
+    def stdout(cls):
+        """Channel on the standard output."""
+        return cls(sys.stdout)
+
+    @classmethod
+    def capture(cls):
+        """In-memory channel, for in-process tests."""
+        return cls(None)
+
+    def write(self, s):
+        """Print the string s, without newline."""
+        self._chunks.append(s)
+        if len(self._chunks) >= self._bufsize:
+            self.flush()
+
+    def println(self, s):
+        """Print the string s, with newline."""
+        self.write(s + '\n')
+
+    def flush(self):
+        """Write all the pending text to the stream."""
+        if not self._chunks:
+            return
+        chunks = self._chunks
+        self._chunks = []
+        out = self._captured if self._captured is not None else self._stream
+        out.write(''.join(chunks))
+        if self._captured is None:
+            out.flush()
+
+    def getvalue(self):
+        """Return all the output printed so far (capture mode only)."""
+        assert self._captured is not None, "getvalue() needs capture mode"
+        self.flush()
+        return self._captured.getvalue()
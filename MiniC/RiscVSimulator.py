@@ -0,0 +1,378 @@
+#! /usr/bin/env python3
+"""
+Simulator for the subset of RV64IM emitted by MiniCC. Replaces
+riscv64-unknown-elf-gcc + spike pk for testing.
+The print builtins of TP04/libprint.s (println_int, print_char...) and exit
+are emulated: libprint.s itself must not be given (it calls printf, and
+uses instructions that are not simulated).
+Usage:
+    python3 RiscVSimulator.py <file.s> [<other.s> ...]
+    python3 RiscVSimulator.py --help
+"""
+
+import argparse
+import re
+import sys
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from Errors import MiniCRuntimeError, MiniCInternalError
+from OutputChannel import OutputChannel
+
+
+XLEN = 64
+MASK = (1 << XLEN) - 1
+
+# ABI names of the integer registers
+REGS: Dict[str, int] = {'x{}'.format(i): i for i in range(32)}
+REGS.update({'zero': 0, 'ra': 1, 'sp': 2, 'gp': 3, 'tp': 4, 'fp': 8, 's0': 8, 's1': 9})
+REGS.update({'t{}'.format(i): i + 5 for i in range(3)})
+REGS.update({'t{}'.format(i): i + 25 for i in range(3, 7)})
+REGS.update({'a{}'.format(i): i + 10 for i in range(8)})
+REGS.update({'s{}'.format(i): i + 16 for i in range(2, 12)})
+RA, SP, A0 = 1, 2, 10
+
+STACK_TOP = 0x7ffff000
+DATA_START = 0x10000
+# Return address of main: returning there exits the program
+EXIT_PC = -1
+
+ARITH = ('add', 'addi', 'sub', 'mul', 'div', 'rem', 'and', 'andi',
+         'or', 'ori', 'xor', 'xori', 'slt', 'slti')
+BRANCHES = ('blt', 'bgt', 'beq', 'bne', 'ble', 'bge')
+LOADS = ('ld', 'lw')
+STORES = ('sd', 'sw')
+
+MEM_RE = re.compile(r'^(-?\w+)\((\w+)\)$')
+
+
+def wrap(v: int) -> int:
+    """Truncate an integer to a signed 64-bit RiscV value."""
+    v &= MASK
+    return v - (1 << XLEN) if v >> (XLEN - 1) else v
+
+
+def div_rd_0(a: int, b: int) -> int:
+    """ Division rounded towards 0 (integer division in Python rounds down). """
+    return -(-a // b) if (a < 0) ^ (b < 0) else a // b
+
+
+def mod_rd_0(a: int, b: int) -> int:
+    """ Modulo rounded towards 0 (integer division in Python rounds down). """
+    return -(-a % b) if (a < 0) ^ (b < 0) else a % b
+
+
+def strip_comment(line: str) -> str:
+    """Remove a # comment, ignoring # inside string literals."""
+    in_string = False
+    for i, c in enumerate(line):
+        if c == '"':
+            in_string = not in_string
+        elif c == '#' and not in_string:
+            return line[:i]
+    return line
+
+
+class Exit(Exception):
+    """Raised by the exit builtin and by the return from main."""
+
+    def __init__(self, code):
+        self.code = code
+
+
+class RiscVSimulator:
+    """Parse RiscV assembly text and run it.
+
+    Instructions are decoded once into tuples (mnemonic, operands...)
+    where registers are numbers and labels are instruction indices, so
+    that the execution loop does no string processing.
+
+    After run(), `steps` is the number of instructions executed and
+    `counts` the number of executions of each mnemonic.
+    """
+
+    _code: List[tuple]
+    _labels: Dict[str, int]
+
+    def __init__(self, *texts: str, output: Optional[OutputChannel] = None,
+                 max_steps=100000000):
+        self._output = output if output is not None else OutputChannel.stdout()
+        self._max_steps = max_steps
+        self._code = []
+        self._labels = dict()
+        self._data_labels: Dict[str, int] = dict()
+        self._strings: Dict[int, str] = dict()
+        self._memory: Dict[int, int] = dict()
+        self._data_end = DATA_START
+        for text in texts:
+            self.parse(text)
+        self._code = [self.decode(ins) for ins in self._code]
+        self.regs = [0] * 32
+        self.steps = 0
+        self.counts: Counter = Counter()
+
+    # Parsing
+
+    def parse(self, text: str) -> None:
+        pending: List[str] = []  # labels waiting for their instruction/data
+        for line in text.splitlines():
+            line = strip_comment(line).strip()
+            while line:
+                m = re.match(r'^([\w.$]+):\s*', line)
+                if not m:
+                    break
+                pending.append(m.group(1))
+                line = line[m.end():]
+            if not line:
+                continue
+            if line.startswith('.'):
+                self.directive(line, pending)
+                continue
+            for lbl in pending:
+                self._labels[lbl] = len(self._code)
+            pending = []
+            parts = line.split(None, 1)
+            args = [a.strip() for a in parts[1].split(',')] if len(parts) > 1 else []
+            self._code.append((parts[0],) + tuple(args))
+        for lbl in pending:
+            self._labels[lbl] = len(self._code)
+
+    def directive(self, line: str, pending: List[str]) -> None:
+        parts = line.split(None, 1)
+        name = parts[0]
+        if name in ('.string', '.asciz'):
+            value = parts[1].strip()[1:-1].replace('""', '"')
+            addr = self.alloc_data(pending, 8 * (len(value) // 8 + 1))
+            self._strings[addr] = value
+        elif name == '.dword':
+            addr = self.alloc_data(pending, 8)
+            self._memory[addr] = int(parts[1], 0)
+        # Other directives (.text, .globl, .align, ...) are ignored.
+
+    def alloc_data(self, pending: List[str], size: int) -> int:
+        addr = self._data_end
+        self._data_end += size
+        for lbl in pending:
+            # Data is mixed with code, the label may also be a jump target
+            self._data_labels[lbl] = addr
+            self._labels[lbl] = len(self._code)
+        pending.clear()
+        return addr
+
+    def reg(self, s: str) -> int:
+        try:
+            return REGS[s]
+        except KeyError:
+            raise MiniCInternalError("Unknown register {}".format(s))
+
+    def target(self, s: str) -> int:
+        try:
+            return self._labels[s]
+        except KeyError:
+            raise MiniCInternalError("Undefined label {}".format(s))
+
+    def decode(self, ins: tuple) -> tuple:
+        """Decode the operands of one instruction."""
+        op, args = ins[0], ins[1:]
+        if op in ARITH:
+            last = args[2]
+            if last in REGS:
+                return (op, self.reg(args[0]), self.reg(args[1]), self.reg(last), False)
+            return (op, self.reg(args[0]), self.reg(args[1]), int(last, 0), True)
+        if op in ('mv', 'not', 'neg', 'seqz', 'snez'):
+            return (op, self.reg(args[0]), self.reg(args[1]))
+        if op == 'li':
+            return (op, self.reg(args[0]), int(args[1], 0))
+        if op == 'la':
+            if args[1] in self._data_labels:
+                return (op, self.reg(args[0]), self._data_labels[args[1]])
+            return (op, self.reg(args[0]), self.target(args[1]))
+        if op in LOADS or op in STORES:
+            m = MEM_RE.match(args[1])
+            if not m:
+                raise MiniCInternalError("Bad memory operand {}".format(args[1]))
+            return (op, self.reg(args[0]), int(m.group(1), 0), self.reg(m.group(2)))
+        if op in BRANCHES:
+            return (op, self.reg(args[0]), self.reg(args[1]), self.target(args[2]))
+        if op in ('beqz', 'bnez'):
+            return (op, self.reg(args[0]), self.target(args[1]))
+        if op == 'j':
+            return (op, self.target(args[0]))
+        if op == 'call':
+            if args[0] in self._labels:
+                return (op, self._labels[args[0]])
+            return ('builtin', args[0])
+        if op == 'jr':
+            return (op, self.reg(args[0]))
+        if op in ('ret', 'nop'):
+            return (op,)
+        raise MiniCInternalError("Unsupported instruction {}".format(' '.join(ins)))
+
+    # Builtins (TP04/libprint.s)
+
+    def builtin(self, name: str) -> None:
+        regs = self.regs
+        if name == 'println_int':
+            self._output.println(str(regs[A0]))
+        elif name == 'print_int':
+            self._output.write(str(regs[A0]))
+        elif name == 'newline':
+            self._output.write('\n')
+        elif name == 'println_char':
+            self._output.println(chr(regs[A0] & 0xff))
+        elif name == 'print_char':
+            self._output.write(chr(regs[A0] & 0xff))
+        elif name == 'println_string':
+            try:
+                self._output.println(self._strings[regs[A0]])
+            except KeyError:
+                raise MiniCRuntimeError("println_string on a non-string")
+        elif name == 'exit':
+            raise Exit(regs[A0] & 0xff)
+        else:
+            raise MiniCInternalError("Unknown function {}".format(name))
+
+    # Execution
+
+    def run(self, entry='main') -> int:
+        """Run from the label entry, return the exit code. The output is
+        flushed in any case."""
+        regs = self.regs
+        regs[SP] = STACK_TOP
+        regs[RA] = EXIT_PC
+        mem = self._memory
+        code = self._code
+        hits = [0] * len(code)
+        pc = self.target(entry)
+        steps = 0
+        try:
+            while True:
+                if pc == EXIT_PC:
+                    raise Exit(regs[A0] & 0xff)
+                if pc >= len(code):
+                    raise MiniCRuntimeError("Executing past the end of the code")
+                ins = code[pc]
+                hits[pc] += 1
+                steps += 1
+                if steps > self._max_steps:
+                    raise MiniCRuntimeError("Too many steps, infinite loop?")
+                pc += 1
+                op = ins[0]
+                if op in ('li', 'la'):
+                    regs[ins[1]] = ins[2]
+                elif op == 'mv':
+                    regs[ins[1]] = regs[ins[2]]
+                elif op in ARITH:
+                    a = regs[ins[2]]
+                    b = ins[3] if ins[4] else regs[ins[3]]
+                    regs[ins[1]] = wrap(self.arith(op, a, b))
+                elif op in BRANCHES:
+                    a, b = regs[ins[1]], regs[ins[2]]
+                    if ((op == 'blt' and a < b) or (op == 'bgt' and a > b)
+                            or (op == 'beq' and a == b) or (op == 'bne' and a != b)
+                            or (op == 'ble' and a <= b) or (op == 'bge' and a >= b)):
+                        pc = ins[3]
+                elif op in LOADS:
+                    regs[ins[1]] = mem.get(regs[ins[3]] + ins[2], 0)
+                elif op in STORES:
+                    mem[regs[ins[3]] + ins[2]] = regs[ins[1]]
+                elif op == 'j':
+                    pc = ins[1]
+                elif op == 'beqz':
+                    if regs[ins[1]] == 0:
+                        pc = ins[2]
+                elif op == 'bnez':
+                    if regs[ins[1]] != 0:
+                        pc = ins[2]
+                elif op == 'builtin':
+                    self.builtin(ins[1])
+                elif op == 'call':
+                    regs[RA] = pc
+                    pc = ins[1]
+                elif op == 'ret':
+                    pc = regs[RA]
+                elif op == 'jr':
+                    pc = regs[ins[1]]
+                elif op == 'not':
+                    regs[ins[1]] = ~regs[ins[2]]
+                elif op == 'neg':
+                    regs[ins[1]] = wrap(-regs[ins[2]])
+                elif op == 'seqz':
+                    regs[ins[1]] = int(regs[ins[2]] == 0)
+                elif op == 'snez':
+                    regs[ins[1]] = int(regs[ins[2]] != 0)
+                regs[0] = 0
+        except Exit as e:
+            return e.code
+        finally:
+            self.steps = steps
+            for n, h in enumerate(hits):
+                if h:
+                    self.counts[code[n][0]] += h
+            self._output.flush()
+
+    def arith(self, op: str, a: int, b: int) -> int:
+        if op in ('add', 'addi'):
+            return a + b
+        if op == 'sub':
+            return a - b
+        if op == 'mul':
+            return a * b
+        if op == 'div':
+            return -1 if b == 0 else div_rd_0(a, b)
+        if op == 'rem':
+            return a if b == 0 else mod_rd_0(a, b)
+        if op in ('and', 'andi'):
+            return a & b
+        if op in ('or', 'ori'):
+            return a | b
+        if op in ('xor', 'xori'):
+            return a ^ b
+        return int(a < b)  # slt, slti
+
+    def code_size(self) -> int:
+        """Static number of instructions."""
+        return len(self._code)
+
+    def loads_stores(self) -> Tuple[int, int]:
+        """Number of loads and stores executed by the last run."""
+        return (sum(self.counts[op] for op in LOADS),
+                sum(self.counts[op] for op in STORES))
+
+
+def simulate(files: List[str], output: Optional[OutputChannel] = None,
+             max_steps=100000000) -> Tuple[int, RiscVSimulator]:
+    """Assemble and run the given .s files, return the exit code and the
+    simulator (for statistics)."""
+    texts = []
+    for name in files:
+        with open(name) as f:
+            texts.append(f.read())
+    sim = RiscVSimulator(*texts, output=output, max_steps=max_steps)
+    return sim.run(), sim
+
+
+# command line management
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate RiscV code generated by MiniCC')
+    parser.add_argument('files', type=str, nargs='+',
+                        help='Assembly files, without TP04/libprint.s '
+                        '(its builtins are emulated).')
+    parser.add_argument('--stats', action='store_true',
+                        default=False,
+                        help='Print the dynamic instruction count on stderr')
+    args = parser.parse_args()
+
+    try:
+        code, sim = simulate(args.files)
+    except MiniCRuntimeError as e:
+        print(e.args[0], file=sys.stderr)
+        exit(1)
+    except MiniCInternalError as e:
+        print(e.args[0], file=sys.stderr)
+        exit(4)
+    if args.stats:
+        loads, stores = sim.loads_stores()
+        print("instructions: {}, loads: {}, stores: {}"
+              .format(sim.steps, loads, stores), file=sys.stderr)
+    exit(code)
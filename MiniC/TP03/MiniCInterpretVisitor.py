@@ -4,6 +4,7 @@ import typing
 from MiniCVisitor import MiniCVisitor
 from MiniCParser import MiniCParser
 from Errors import MiniCRuntimeError, MiniCInternalError
+from OutputChannel import OutputChannel
 
 MINIC_VALUE = typing.Union[int, str, bool, float, List['MINIC_VALUE']]
 
@@ -12,9 +13,12 @@ class MiniCInterpretVisitor(MiniCVisitor):
 
     _memory: Dict[str, MINIC_VALUE]
 
-    def __init__(self):
+    def __init__(self, output=None):
         self._memory = dict()  # store all variable ids and values.
         self.has_main = False
+        # println_* go through a buffered channel, flushed at the end of
+        # the program (see visitProgRule).
+        self._output = output if output is not None else OutputChannel.stdout()
 
     # visitors for variable declarations
 
@@ -134,17 +138,17 @@ class MiniCInterpretVisitor(MiniCVisitor):
         val = self.visit(ctx.expr())
         if isinstance(val, bool):
             val = '1' if val else '0'
-        print(val)
+        self._output.println(str(val))
 
     def visitPrintlnfloatStat(self, ctx) -> None:
         val = self.visit(ctx.expr())
         if isinstance(val, float):
             val = "%.2f" % val
-        print(val)
+        self._output.println(str(val))
 
     def visitPrintlnstringStat(self, ctx) -> None:
         val = self.visit(ctx.expr())
-        print(val)
+        self._output.println(str(val))
 
     def visitAssignStat(self, ctx) -> None:
         raise NotImplementedError()
@@ -157,7 +161,12 @@ class MiniCInterpretVisitor(MiniCVisitor):
 
     # TOPLEVEL
     def visitProgRule(self, ctx) -> None:
-        self.visitChildren(ctx)
+        try:
+            self.visitChildren(ctx)
+        finally:
+            # Also before a runtime error is reported, to keep the output
+            # order.
+            self._output.flush()
         if not self.has_main:
             # A program without a main function is compilable (hence
             # it's not a typing error per se), but not executable,
@@ -8,7 +8,7 @@ from .Operands import (
     A0,
     ZERO)
 from .Instruction3A import (
-    Instru3A, Jump, CondJump, Comment, Label
+    Instru3A, Jump, CondJump, Comment, Label, rewrite_instructions
 )
 
 """
@@ -29,6 +29,8 @@ class LinearCode:
         self._start = None
         self._label_div_by_zero = self.new_label("div_by_zero")
         self._stacksize = 0
+        # Comment the rewritten instructions in the generated code
+        self._asm_comments = True
 
     def add_instruction(self, i, link_with_succ=True):
         """Utility function to add an instruction in the program.
@@ -42,27 +44,16 @@ class LinearCode:
         For each real instruction (not label or comment), call f,
         which must return either None or a list of instruction. If it
         returns None, nothing happens. If it returns a list, then the
-        instruction is replaced by this list.
+        instruction is replaced by this list, surrounded by comments
+        unless asm comments are disabled (see set_asm_comments).
 
         """
-        i = 0
-        while i < len(self._listIns):
-            old_i = self._listIns[i]
-            if not old_i.is_instruction():
-                i += 1
-                continue
-            new_i_list = f(old_i)
-            if new_i_list is None:
-                i += 1
-                continue
-            del self._listIns[i]
-            self._listIns.insert(i, Comment(str(old_i)))
-            i += 1
-            for new_i in new_i_list:
-                self._listIns.insert(i, new_i)
-                i += 1
-            self._listIns.insert(i, Comment("end " + str(old_i)))
-            i += 1
+        self._listIns[:] = rewrite_instructions(self._listIns, f,
+                                                self._asm_comments)
+
+    def set_asm_comments(self, enable):
+        """Enable or disable comments in rewritten code."""
+        self._asm_comments = enable
 
     def get_instructions(self):
         return self._listIns
@@ -99,9 +90,18 @@ class LinearCode:
         return self._label_div_by_zero
 
     # each instruction has its own "add in list" version
-    def add_label(self, s):
+    def add_label(self, s, sealed=True):
+        """Add the label s. sealed is False if jumps to s will be added
+        after it (loop heads), and seal_label(s) is then called after the
+        last one: this is only used to build SSA on the fly (see
+        TP05/SSABuilder.py), which also accepts loop heads added with the
+        default, at the cost of building the SSA form twice."""
         return self.add_instruction(s)
 
+    def seal_label(self, s):
+        """All the jumps to the label s have been added (see add_label)."""
+        pass
+
     def add_comment(self, s):
         self.add_instruction(Comment(s))
 
@@ -1,4 +1,5 @@
-from typing import List
+from enum import Enum
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
 from .Operands import (Operand, Immediate, Renamer, Temporary)
 
 """
@@ -6,14 +7,141 @@ MIF08, CAP, API RiscV. 3A instruction constructors.
 """
 
 
+class JumpKind(Enum):
+    NONE = 0
+    JUMP = 1
+    COND = 2
+
+
+class Opcode(Enum):
+    """RiscV opcodes used in the 3-address code, with their static metadata:
+
+    - text: the name of the opcode, in lower case;
+    - read_only: True if the instruction is considered to only read from
+      its operands, in defined/used and is_read_only. The jumps, and as
+      in the original is_read_only the loads, whose destination is then a
+      use; the stores are not (their first operand is a definition);
+    - jump: whether it is an unconditional or conditional jump;
+    - side_effects: True if the instruction does more than writing its
+      destination (memory, control flow, calls).
+    """
+
+    def __init__(self, text, read_only, jump, side_effects):
+        self.text = text
+        self.read_only = read_only
+        self.jump = jump
+        self.side_effects = side_effects
+
+    #        text       read_only jump        side_effects
+    ADD = ("add", False, JumpKind.NONE, False)
+    ADDI = ("addi", False, JumpKind.NONE, False)
+    SUB = ("sub", False, JumpKind.NONE, False)
+    MUL = ("mul", False, JumpKind.NONE, False)
+    DIV = ("div", False, JumpKind.NONE, False)
+    REM = ("rem", False, JumpKind.NONE, False)
+    AND = ("and", False, JumpKind.NONE, False)
+    OR = ("or", False, JumpKind.NONE, False)
+    XOR = ("xor", False, JumpKind.NONE, False)
+    NOT = ("not", False, JumpKind.NONE, False)
+    LI = ("li", False, JumpKind.NONE, False)
+    MV = ("mv", False, JumpKind.NONE, False)
+    LA = ("la", False, JumpKind.NONE, False)
+    LD = ("ld", True, JumpKind.NONE, False)
+    LW = ("lw", True, JumpKind.NONE, False)
+    LB = ("lb", True, JumpKind.NONE, False)
+    SD = ("sd", False, JumpKind.NONE, True)
+    SW = ("sw", False, JumpKind.NONE, True)
+    SB = ("sb", False, JumpKind.NONE, True)
+    J = ("j", True, JumpKind.JUMP, True)
+    BEQ = ("beq", True, JumpKind.COND, True)
+    BNE = ("bne", True, JumpKind.COND, True)
+    BLT = ("blt", True, JumpKind.COND, True)
+    BLE = ("ble", True, JumpKind.COND, True)
+    BGT = ("bgt", True, JumpKind.COND, True)
+    BGE = ("bge", True, JumpKind.COND, True)
+    BEQZ = ("beqz", True, JumpKind.COND, True)
+    BNEZ = ("bnez", True, JumpKind.COND, True)
+    CALL = ("call", False, JumpKind.NONE, True)
+    STRING = (".string", False, JumpKind.NONE, True)
+
+
+class OpInfo(NamedTuple):
+    """Metadata of an opcode name, shared by all its instructions."""
+    name: str  # lower case
+    opcode: Optional[Opcode]  # None for opcodes missing from the table
+    read_only: bool
+    is_jump: bool
+    is_cond_jump: bool
+    side_effects: bool
+
+
+def _make_opinfo(opname: str) -> OpInfo:
+    name = opname.lower()
+    opcode = next((op for op in Opcode if op.text == name), None)
+    if opcode is not None:
+        return OpInfo(name, opcode, opcode.read_only,
+                      opcode.jump != JumpKind.NONE,
+                      opcode.jump == JumpKind.COND, opcode.side_effects)
+    # Unknown opcode: branches start with b, the others write their first
+    # operand.
+    cond = name.startswith("b")
+    return OpInfo(name, None, cond or name == "j", cond or name == "j",
+                  cond, True)
+
+
+# Interned metadata, by opcode name as given to Instru3A
+_opinfos: Dict[str, OpInfo] = {}
+
+
+def opinfo(opname: str) -> OpInfo:
+    """Metadata of the opcode opname (in any case)."""
+    info = _opinfos.get(opname)
+    if info is None:
+        info = _opinfos[opname] = _make_opinfo(opname)
+    return info
+
+
 def regset_to_string(registerset):
     """Utilitary function: pretty-prints a set of locations."""
     return "{" + ",".join(str(x) for x in registerset) + "}"
 
 
+def rewrite_instructions(instructions, f, comments=True):
+    """Return the list instructions where each real instruction old_i (not
+    label or comment) such that f(old_i) is a list is replaced by this
+    list, surrounded by comments giving old_i if comments is True. Linear
+    time: the result is built in one pass instead of inserting in the list.
+    """
+    new_list = []
+    if not comments:
+        for old_i in instructions:
+            new_i_list = f(old_i) if old_i.is_instruction() else None
+            if new_i_list is None:
+                new_list.append(old_i)
+            else:
+                new_list.extend(new_i_list)
+        return new_list
+    for old_i in instructions:
+        if not old_i.is_instruction():
+            new_list.append(old_i)
+            continue
+        new_i_list = f(old_i)
+        if new_i_list is None:
+            new_list.append(old_i)
+            continue
+        old_str = str(old_i)
+        new_list.append(Comment(old_str))
+        new_list.extend(new_i_list)
+        new_list.append(Comment("end " + old_str))
+    return new_list
+
+
 class Instruction:
 
     """Real instruction, comment or label."""
+
+    __slots__ = ('_ins',)
+
     def __init__(self):
         self._ins = None
 
@@ -49,18 +177,32 @@ class Instruction:
 
 class Instru3A(Instruction):
 
+    __slots__ = ('_info', '_args', '_defined', '_used')
+
     def __init__(self, ins, arg1=None, arg2=None, arg3=None, args=None):
         super().__init__()
         self._ins = ins
-        if args:
-            self.args = args
-        else:
-            self.args = [arg for arg in (arg1, arg2, arg3) if arg is not None]
-        args = self.args
+        self._info = opinfo(ins)
+        if not args:
+            args = [arg for arg in (arg1, arg2, arg3) if arg is not None]
+        args = list(args)
         for i in range(len(args)):
             if isinstance(args[i], int):
                 args[i] = Immediate(args[i])
             assert isinstance(args[i], Operand), (args[i], type(args[i]))
+        self.args = args
+
+    @property
+    def args(self) -> Tuple[Operand, ...]:
+        """The operands, as a tuple. Assign a new sequence to change them:
+        the defined and used temporaries are cached."""
+        return self._args
+
+    @args.setter
+    def args(self, args: Sequence[Operand]):
+        self._args = tuple(args)
+        self._defined: Optional[List[Operand]] = None
+        self._used: Optional[List[Operand]] = None
 
     def is_instruction(self):
         """True if the object is a true instruction (not a label or
@@ -69,16 +211,19 @@ class Instru3A(Instruction):
 
     def get_name(self):
         # convention is to use lower-case in RISCV, even though not strictly necessary
-        return self._ins.lower()
+        return self._info.name
+
+    def get_opcode(self) -> Optional[Opcode]:
+        """The opcode, None if it is not in the Opcode table."""
+        return self._info.opcode
 
     def is_jump(self):
         """True if the instruction is a jump (conditional or not)."""
-        return (self.get_name().startswith("b")
-                or self.get_name() == "j")
+        return self._info.is_jump
 
     def is_cond_jump(self):
         """True if the instruction is a conditional jump."""
-        return self.get_name().startswith("b")
+        return self._info.is_cond_jump
 
     def is_read_only(self):
         """True if the instruction only reads from its operands.
@@ -86,34 +231,42 @@ class Instru3A(Instruction):
         Otherwise, the first operand is considered as the destination
         and others are source.
         """
-        return (self.get_name().startswith("b")
-                or self.get_name() == "j"
-                or self.get_name() == "ld"
-                or self.get_name() == "lw"
-                or self.get_name() == "lb")
-
-    def defined(self):
-        if self.is_read_only():
-            defs = []
-        else:
-            defs = [self.args[0]]
-        return [arg for arg in defs if isinstance(arg, Temporary)]
+        return self._info.read_only
+
+    def has_side_effects(self):
+        """True if the instruction does more than writing its destination."""
+        return self._info.side_effects
 
-    def used(self):
-        if self.is_read_only():
-            uses = self.args
+    def _compute_def_use(self):
+        args = self._args
+        if self._info.read_only:
+            self._defined = []
+            self._used = [arg for arg in args if isinstance(arg, Temporary)]
         else:
-            uses = self.args[1:]
-        return [arg for arg in uses if isinstance(arg, Temporary)]
+            self._defined = [arg for arg in args[:1] if isinstance(arg, Temporary)]
+            self._used = [arg for arg in args[1:] if isinstance(arg, Temporary)]
+
+    def defined(self) -> List[Operand]:
+        """Temporaries written by the instruction (do not modify the list)."""
+        if self._defined is None:
+            self._compute_def_use()
+        return self._defined  # type: ignore
+
+    def used(self) -> List[Operand]:
+        """Temporaries read by the instruction (do not modify the list)."""
+        if self._used is None:
+            self._compute_def_use()
+        return self._used  # type: ignore
 
     def rename(self, renamer: Renamer):
-        for i, arg in enumerate(self.args):
-            if isinstance(arg, Temporary):
-                if i == 0 and not self.is_read_only():
-                    new_t = renamer.fresh(arg)
-                else:
-                    new_t = renamer.replace(arg)
-                self.args[i] = new_t
+        # The uses first, for mv temp_1, temp_1 to read the previous name
+        new_args = [renamer.replace(arg) if isinstance(arg, Temporary)
+                    and (i > 0 or self._info.read_only) else arg
+                    for i, arg in enumerate(self._args)]
+        if new_args and not self._info.read_only \
+                and isinstance(new_args[0], Temporary):
+            new_args[0] = renamer.fresh(new_args[0])
+        self.args = new_args
 
     def __str__(self):
         s = self._ins
@@ -156,6 +309,8 @@ class Instru3A(Instruction):
 class Label(Instruction, Operand):
     """ A label is here a regular instruction"""
 
+    __slots__ = ('_name',)
+
     def __init__(self, name, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._name = name
@@ -177,6 +332,8 @@ class Label(Instruction, Operand):
 class Jump(Instru3A):
     """ A Jump is a specific kind of instruction"""
 
+    __slots__ = ()
+
     def __init__(self, label: Label):
         super().__init__("j", label)
 
@@ -184,14 +341,18 @@ class Jump(Instru3A):
 class CondJump(Instru3A):
     """ A Conditional Jump is a specific kind of instruction"""
 
+    __slots__ = ()
+
     def __init__(self, ins, op1, op2, label: Label):
-        assert(ins.startswith("b"))
         super().__init__(ins, op1, op2, label)
+        assert(self.is_cond_jump())
 
 
 class Comment(Instruction):
     """ A comment is here a regular instruction"""
 
+    __slots__ = ('_content',)
+
     def __init__(self, content, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._content = content
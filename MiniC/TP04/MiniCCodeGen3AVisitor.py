@@ -5,6 +5,10 @@ from .APIRiscV import (LinearCode, Condition)
 from . import Operands
 from antlr4.tree.Trees import Trees
 from Errors import MiniCInternalError, MiniCUnsupportedError
+try:  # SSA built during code generation, for TP05a (CAP)
+    from TP05.SSABuilder import SSALinearCode  # type: ignore[import]
+except ModuleNotFoundError:
+    pass
 
 """
 CAP, MIF08, three-address code generation + simple alloc
@@ -16,10 +20,13 @@ class MiniCCodeGen3AVisitor(MiniCVisitor):
 
     _current_function: LinearCode
 
-    def __init__(self, debug, parser):
+    def __init__(self, debug, parser, ssa=False):
+        """With ssa, the code of each function is built directly in SSA
+        form (see TP05/SSABuilder.py)."""
         super().__init__()
         self._parser = parser
         self._debug = debug
+        self._ssa = ssa
         self._functions = []
         self._lastlabel = ""
 
@@ -127,7 +134,10 @@ class MiniCCodeGen3AVisitor(MiniCVisitor):
 
     def visitFuncDecl(self, ctx) -> None:
         funcname = ctx.ID().getText()
-        self._current_function = LinearCode(funcname)
+        if self._ssa:
+            self._current_function = SSALinearCode(funcname)
+        else:
+            self._current_function = LinearCode(funcname)
         self._symbol_table = dict()
 
         self.visit(ctx.vardecl_l())
@@ -137,6 +147,8 @@ class MiniCCodeGen3AVisitor(MiniCVisitor):
         # hardcodes a "return 0;" at the end of function. Generate
         # code for this "return 0;".
         self._current_function.add_instruction_LI(Operands.A0, 0)
+        if self._ssa:
+            self._current_function.finish_ssa()
         self._functions.append(self._current_function)
         del self._current_function
 
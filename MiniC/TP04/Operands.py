@@ -1,4 +1,5 @@
-from typing import Dict
+from collections.abc import MutableSet
+from typing import Dict, List, Optional, Tuple
 from MiniCParser import MiniCParser
 from Errors import MiniCInternalError
 
@@ -10,6 +11,9 @@ MIF08, CAP, CodeGeneration, RiscV API
 
 class Operand():
 
+    # Operands are created by the hundred thousands: no per-instance __dict__
+    __slots__ = ()
+
     def is_label(self):
         """True if the instruction is a label."""
         return False
@@ -52,6 +56,8 @@ class Condition(Operand):
     A 'negate' method allows getting the negation of this condition.
     """
 
+    __slots__ = ('_op',)
+
     def __init__(self, optype):
         if optype in opdict:
             self._op = opdict[optype]
@@ -68,10 +74,22 @@ class Condition(Operand):
 
 
 class Function(Operand):
-    """Operand for build-in function call"""
+    """Operand for build-in function call.
+
+    Functions are interned: Function(name) always returns the same object
+    for the same name.
+    """
 
-    def __init__(self, name):
-        self._name = name
+    __slots__ = ('_name',)
+    _interned: Dict[str, 'Function'] = dict()
+
+    def __new__(cls, name):
+        f = cls._interned.get(name)
+        if f is None:
+            f = super().__new__(cls)
+            f._name = name
+            cls._interned[name] = f
+        return f
 
     def __str__(self):
         return self._name
@@ -82,6 +100,8 @@ class DataLocation(Operand):
     or a place in memory (offset)
     """
 
+    __slots__ = ()
+
     def is_temporary(self):
         """True if the location is a temporary, i.e. needs to be replaced
         during code generation.
@@ -93,6 +113,8 @@ class Offset(DataLocation):
     """ Offset = address in memory computed with base + offset
     """
 
+    __slots__ = ('_offset', '_basereg')
+
     def __init__(self, basereg, offset):
         super().__init__()
         assert isinstance(offset, int)
@@ -110,18 +132,27 @@ class Offset(DataLocation):
 
 class Register(DataLocation):
     """ A (physical) register
+
+    Registers are interned: Register(n) always returns the same object
+    for the same number.
     """
 
-    def __init__(self, number):
-        super().__init__()
-        self._number = number
+    __slots__ = ('_number', '_name')
+    _interned: Dict[int, 'Register'] = dict()
+
+    def __new__(cls, number):
+        r = cls._interned.get(number)
+        if r is None:
+            r = super().__new__(cls)
+            r._number = number
+            r._name = reg_map.get(number)
+            cls._interned[number] = r
+        return r
 
     def __str__(self):
-        numreg = self._number
-        if numreg not in reg_map:
-            raise Exception("Register number %d should not be used", numreg)
-        else:
-            return ("{}".format(reg_map[numreg]))
+        if self._name is None:
+            raise Exception("Register number %d should not be used", self._number)
+        return self._name
 
     def __repr__(self):
         return self.__str__()
@@ -137,6 +168,8 @@ class RegisterAdd(DataLocation):
     """ A (physical) special register for addresses
     """
 
+    __slots__ = ('_number',)
+
     def __init__(self, number):
         super().__init__()
         self._number = number
@@ -152,14 +185,27 @@ class RegisterAdd(DataLocation):
 
 
 class Immediate(DataLocation):
-    """Immediate operand (integer)."""
+    """Immediate operand (integer).
 
-    def __init__(self, val):
-        super().__init__()
-        self._val = val
+    Immediates are interned: Immediate(v) always returns the same object
+    for the same integer v.
+    """
+
+    __slots__ = ('_val', '_str')
+    _interned: Dict[int, 'Immediate'] = dict()
+
+    def __new__(cls, val):
+        imm = cls._interned.get(val) if type(val) is int else None
+        if imm is None:
+            imm = super().__new__(cls)
+            imm._val = val
+            imm._str = str(val)
+            if type(val) is int:
+                cls._interned[val] = imm
+        return imm
 
     def __str__(self):
-        return str(self._val)
+        return self._str
 
 
 # Shortcuts for registers in RISCV
@@ -183,7 +229,11 @@ GP_REGS = S[4:] + T  # s0, ..., s3 are special
 
 
 class TemporaryPool:
-    """Manage a pool of temporaries."""
+    """Manage a pool of temporaries.
+
+    Temporaries of a pool have dense integer ids 0, 1, ..., in creation
+    order (see Temporary.get_id and TempSet).
+    """
 
     def __init__(self):
         self._all_temps = []
@@ -192,6 +242,7 @@ class TemporaryPool:
 
     def add_tmp(self, reg):
         """Add a register to the pool."""
+        assert reg._number == len(self._all_temps), "temporary ids must be dense"
         self._all_temps.append(reg)
         self._allocation[reg] = reg  # While no allocation, return the temporary itself
 
@@ -224,12 +275,18 @@ class TemporaryPool:
         """Get the actual DataLocation allocated for the temporary reg."""
         return self._allocation[reg]
 
+    def get_temp(self, id):
+        """Get the temporary of id id."""
+        return self._all_temps[id]
+
 
 class Temporary(DataLocation):
     """Temporary, are locations that haven't been
     allocated yet. They will later be mapped to physical registers
     (Register) or to a memory location."""
 
+    __slots__ = ('_number', '_pool')
+
     def __init__(self, number, pool):
         self._number = number
         self._pool = pool
@@ -243,27 +300,193 @@ class Temporary(DataLocation):
     def get_alloced_loc(self):
         return self._pool.get_alloced_loc(self)
 
+    def get_id(self):
+        """Dense id of the temporary in its pool."""
+        return self._number
+
     def is_temporary(self):
         return True
 
 
+class TempSet(MutableSet):
+    """Set of temporaries of a pool, stored as a bit-vector (a Python int
+    whose bit i is set iff the temporary of id i is in the set).
+
+    Union, intersection and difference cost one big-int operation instead
+    of hashing each element. A TempSet is a collections.abc.MutableSet, so
+    it can replace a set of temporaries: with another TempSet the
+    operations work on the bit-vectors, with any other set (e.g. a set of
+    temporaries) they work element by element, as for sets. The pool is
+    taken from the first temporary added.
+    """
+
+    __slots__ = ('_pool', '_bits')
+
+    def __init__(self, temps=(), pool=None, bits=0):
+        self._pool = pool
+        self._bits = bits
+        for t in temps:
+            self.add(t)
+
+    @classmethod
+    def _from_iterable(cls, it):
+        """Result of an operation with a set which is not a TempSet: a set
+        if it has elements that are not temporaries."""
+        elements = list(it)
+        if all(isinstance(t, Temporary) for t in elements):
+            return cls(elements)
+        return set(elements)
+
+    def _make(self, other, bits):
+        return TempSet(pool=self._pool or other._pool, bits=bits)
+
+    def bits(self):
+        """The bit-vector, as an int."""
+        return self._bits
+
+    def copy(self):
+        return TempSet(pool=self._pool, bits=self._bits)
+
+    def add(self, t: Temporary):
+        assert isinstance(t, Temporary), t
+        if self._pool is None:
+            self._pool = t._pool
+        self._bits |= 1 << t._number
+
+    def discard(self, t: Temporary):
+        if isinstance(t, Temporary):
+            self._bits &= ~(1 << t._number)
+
+    def clear(self):
+        self._bits = 0
+
+    def update(self, temps):
+        if type(temps) is TempSet:
+            self._pool = self._pool or temps._pool
+            self._bits |= temps._bits
+        else:
+            for t in temps:
+                self.add(t)
+
+    def __contains__(self, t):
+        return isinstance(t, Temporary) and (self._bits >> t._number) & 1 == 1
+
+    def __iter__(self):
+        bits = self._bits
+        temps = self._pool._all_temps if bits else None
+        while bits:
+            low = bits & -bits
+            yield temps[low.bit_length() - 1]
+            bits ^= low
+
+    def __len__(self):
+        return bin(self._bits).count("1")
+
+    def __bool__(self):
+        return self._bits != 0
+
+    # The methods below are those of MutableSet, with a fast path for the
+    # TempSets (type(...) is TempSet is quicker than isinstance on an ABC)
+
+    def __eq__(self, other):
+        if type(other) is TempSet:
+            return self._bits == other._bits
+        return super().__eq__(other)
+
+    __hash__ = None  # type: ignore  # mutable, like set
+
+    def __le__(self, other):
+        if type(other) is TempSet:
+            return self._bits & ~other._bits == 0
+        return super().__le__(other)
+
+    def __ge__(self, other):
+        if type(other) is TempSet:
+            return other._bits & ~self._bits == 0
+        return super().__ge__(other)
+
+    def __or__(self, other):
+        if type(other) is TempSet:
+            return self._make(other, self._bits | other._bits)
+        return super().__or__(other)
+
+    __ror__ = __or__
+
+    def __and__(self, other):
+        if type(other) is TempSet:
+            return self._make(other, self._bits & other._bits)
+        return super().__and__(other)
+
+    __rand__ = __and__
+
+    def __sub__(self, other):
+        if type(other) is TempSet:
+            return self._make(other, self._bits & ~other._bits)
+        return super().__sub__(other)
+
+    def __ior__(self, other):
+        if type(other) is TempSet:
+            self._pool = self._pool or other._pool
+            self._bits |= other._bits
+            return self
+        return super().__ior__(other)
+
+    def __iand__(self, other):
+        if type(other) is TempSet:
+            self._bits &= other._bits
+            return self
+        return super().__iand__(other)
+
+    def __isub__(self, other):
+        if type(other) is TempSet:
+            self._bits &= ~other._bits
+            return self
+        return super().__isub__(other)
+
+    def __repr__(self):
+        return "{" + ", ".join(str(t) for t in self) + "}"
+
+
 class Renamer:
+    """Current names of the temporaries during SSA renaming.
+
+    fresh(t) logs the name of t it shadows, so that all the names given
+    since mark() can be dropped by undo(mark) (e.g. when leaving a subtree
+    of the domination tree), instead of copying the environment.
+    """
 
     _pool: TemporaryPool
     _env: Dict[Temporary, Temporary]
+    _log: List[Tuple[Temporary, Optional[Temporary]]]
 
     def __init__(self, pool):
         self._pool = pool
         self._env = dict()
+        self._log = []
 
     def fresh(self, t: Temporary):
         new_t = self._pool.new_tmp()
+        self._log.append((t, self._env.get(t)))
         self._env[t] = new_t
         return new_t
 
     def replace(self, t: Temporary):
         return self._env.get(t)
 
+    def mark(self) -> int:
+        """A mark of the current names, for undo."""
+        return len(self._log)
+
+    def undo(self, mark: int):
+        """Restore the names as they were at mark."""
+        env, log = self._env, self._log
+        while len(log) > mark:
+            t, old = log.pop()
+            if old is None:
+                del env[t]
+            else:
+                env[t] = old
+
     def copy(self):
         r = Renamer(self._pool)
         r._env = self._env.copy()
@@ -0,0 +1,205 @@
+from array import array
+from typing import Dict, List, Optional, Tuple
+from .Operands import (Operand, Temporary, TemporaryPool, Register, Immediate)
+from .Instruction3A import (Instruction, Instru3A, opinfo)
+
+"""
+MIF08, CAP, compact storage of 3-address code.
+Instructions are stored as parallel arrays of integers (struct of arrays)
+instead of lists of Instru3A objects, to save memory on large functions
+and let analyses scan integer arrays.
+"""
+
+# Operand kinds
+TEMP = 0  # id: temporary id in the pool
+REG = 1   # id: register number
+IMM = 2   # id: value
+OTHER = 3  # id: index in the constant table (labels, offsets, functions...)
+
+# Kind of the instruction (_ops) for objects that are not Instru3A
+# (labels, comments, phi nodes...): they are kept as they are.
+OBJECT = -1
+
+_IMM_MIN = -(1 << 63)
+_IMM_MAX = (1 << 63) - 1
+
+# Interned instruction shapes: (class, opcode name as spelled), shared by
+# all the packed instructions, and whether their first operand is a use.
+_shapes: List[Tuple[type, str]] = []
+_shape_ids: Dict[Tuple[type, str], int] = dict()
+_shape_read_only: List[bool] = []
+
+
+def _shape_id(ins: Instru3A) -> int:
+    key = (type(ins), ins._ins)
+    sid = _shape_ids.get(key)
+    if sid is None:
+        sid = _shape_ids[key] = len(_shapes)
+        _shapes.append(key)
+        _shape_read_only.append(opinfo(ins._ins).read_only)
+    return sid
+
+
+class PackedInstructions:
+    """A list of instructions stored as parallel arrays:
+
+    - ops[k]: id of the class and opcode of instruction k, OBJECT for
+      instructions that are not Instru3A (see objects);
+    - arg_start[k] .. arg_start[k+1]: range of the operands of k in
+      arg_kind (TEMP, REG, IMM or OTHER) and arg_id;
+    - dest[k]: id of the temporary written by k, -1 if none.
+
+    get(k) and to_list() rebuild Instru3A objects (the view layer), the
+    other methods work on the arrays directly.
+    """
+
+    __slots__ = ('_pool', '_ops', '_arg_start', '_arg_kind', '_arg_id',
+                 '_dest', '_objects', '_consts')
+
+    def __init__(self, instructions: List[Instruction],
+                 pool: Optional[TemporaryPool] = None):
+        self._pool = pool
+        self._ops = array('i')
+        self._arg_start = array('i', [0])
+        self._arg_kind = array('b')
+        self._arg_id = array('q')
+        self._dest = array('q')
+        self._objects: Dict[int, Instruction] = dict()
+        self._consts: List[Operand] = []
+        for ins in instructions:
+            self.append(ins)
+
+    def append(self, ins: Instruction) -> None:
+        k = len(self._ops)
+        if not isinstance(ins, Instru3A):
+            self._objects[k] = ins
+            self._ops.append(OBJECT)
+            self._dest.append(-1)
+            self._arg_start.append(self._arg_start[-1])
+            return
+        self._ops.append(_shape_id(ins))
+        kind, id = self._arg_kind.append, self._arg_id.append
+        for arg in ins.args:
+            if isinstance(arg, Temporary):
+                if self._pool is None:
+                    self._pool = arg._pool
+                kind(TEMP)
+                id(arg._number)
+            elif isinstance(arg, Register):
+                kind(REG)
+                id(arg._number)
+            elif (isinstance(arg, Immediate) and type(arg._val) is int
+                  and _IMM_MIN <= arg._val <= _IMM_MAX):
+                kind(IMM)
+                id(arg._val)
+            else:
+                kind(OTHER)
+                id(len(self._consts))
+                self._consts.append(arg)
+        self._arg_start.append(len(self._arg_kind))
+        defs = ins.defined()
+        self._dest.append(defs[0]._number if defs else -1)
+
+    def __len__(self):
+        return len(self._ops)
+
+    def _operand(self, j: int) -> Operand:
+        kind, id = self._arg_kind[j], self._arg_id[j]
+        if kind == TEMP:
+            return self._pool.get_temp(id)  # type: ignore
+        if kind == REG:
+            return Register(id)
+        if kind == IMM:
+            return Immediate(id)
+        return self._consts[id]
+
+    def get(self, k: int) -> Instruction:
+        """A new object for instruction k (same class, opcode and
+        operands as the packed instruction)."""
+        sid = self._ops[k]
+        if sid == OBJECT:
+            return self._objects[k]
+        cls, name = _shapes[sid]
+        args = [self._operand(j)
+                for j in range(self._arg_start[k], self._arg_start[k + 1])]
+        ins = cls.__new__(cls)
+        Instru3A.__init__(ins, name, args=args)
+        return ins
+
+    def to_list(self) -> List[Instruction]:
+        """Unpack all the instructions."""
+        return [self.get(k) for k in range(len(self._ops))]
+
+    def uses(self, k: int) -> List[int]:
+        """Ids of the temporaries read by instruction k."""
+        sid = self._ops[k]
+        if sid == OBJECT:
+            return [t._number for t in self._objects[k].used()
+                    if isinstance(t, Temporary)]
+        start, end = self._arg_start[k], self._arg_start[k + 1]
+        if not _shape_read_only[sid]:
+            start += 1
+        kinds, ids = self._arg_kind, self._arg_id
+        return [ids[j] for j in range(start, end) if kinds[j] == TEMP]
+
+    def defs_bits(self, k: int) -> int:
+        """Bit-vector of the temporaries written by instruction k."""
+        if self._ops[k] == OBJECT:
+            bits = 0
+            for t in self._objects[k].defined():
+                bits |= 1 << t._number
+            return bits
+        d = self._dest[k]
+        return 1 << d if d >= 0 else 0
+
+    def uses_bits(self, k: int) -> int:
+        """Bit-vector of the temporaries read by instruction k."""
+        bits = 0
+        for t in self.uses(k):
+            bits |= 1 << t
+        return bits
+
+    def _def_use_bits(self) -> List[Tuple[int, int]]:
+        """defs_bits(k) and uses_bits(k) of each instruction k, in one scan
+        of the arrays."""
+        ops, starts, kinds, ids, dest = (self._ops, self._arg_start,
+                                         self._arg_kind, self._arg_id, self._dest)
+        res = []
+        for k, sid in enumerate(ops):
+            if sid == OBJECT:
+                res.append((self.defs_bits(k), self.uses_bits(k)))
+                continue
+            start = starts[k] if _shape_read_only[sid] else starts[k] + 1
+            uses = 0
+            for j in range(start, starts[k + 1]):
+                if kinds[j] == TEMP:
+                    uses |= 1 << ids[j]
+            d = dest[k]
+            res.append((1 << d if d >= 0 else 0, uses))
+        return res
+
+    def gen_kill(self) -> Tuple[int, int]:
+        """Bit-vectors of the temporaries used before any definition, and
+        of the temporaries defined, in the instruction list."""
+        gen = kill = 0
+        for defs, uses in self._def_use_bits():
+            gen |= uses & ~kill
+            kill |= defs
+        return gen, kill
+
+    def liveout_bits(self, out: int) -> List[int]:
+        """Temporaries live after each instruction, given the temporaries
+        live at the end of the list."""
+        res = [0] * len(self._ops)
+        live = out
+        def_use = self._def_use_bits()
+        for k in range(len(self._ops) - 1, -1, -1):
+            res[k] = live
+            defs, uses = def_use[k]
+            live = (live & ~defs) | uses
+        return res
+
+    def nbytes(self) -> int:
+        """Size of the integer arrays, in bytes."""
+        return sum(a.itemsize * len(a) for a in
+                   (self._ops, self._arg_start, self._arg_kind, self._arg_id, self._dest))
@@ -1,4 +1,6 @@
-from TP04.Operands import Temporary, S, GP_REGS, FP
+from itertools import chain
+from typing import List
+from TP04.Operands import Temporary, TempSet, S, GP_REGS, FP
 from TP04.Instruction3A import Instru3A
 from Errors import AllocationError
 
@@ -17,6 +19,22 @@ class Allocator():
         self.prepare()
         self.rewriteCode(self._function_code)
 
+    def used_temps(self) -> List[Temporary]:
+        """The temporaries that appear in the code, in the order of the
+        pool. The pool can also hold temporaries that some pass no longer
+        uses (e.g. the copies merged by exit_ssa_coalescing)."""
+        temps = TempSet()
+
+        def gather(i):
+            used = i.used()
+            if isinstance(used, dict):  # Phi node: operand by predecessor
+                used = used.values()
+            for t in chain(i.defined(), used):
+                if isinstance(t, Temporary):
+                    temps.add(t)
+        self._function_code.iter_instructions(gather)
+        return list(temps)
+
 
 class NaiveAllocator(Allocator):
     def __init__(self, *args):
@@ -28,13 +46,14 @@ class NaiveAllocator(Allocator):
         Fail if there are too many temporaries."""
         regs = list(GP_REGS)  # Get a writable copy
         temp_allocation = dict()
-        for tmp in self._function_code._pool._all_temps:
+        temps = self.used_temps()
+        for tmp in temps:
             try:
                 reg = regs.pop()
             except IndexError:
                 raise AllocationError(
                     "Too many temporaries ({}) for the naive allocation, sorry."
-                    .format(len(self._function_code._pool._all_temps)))
+                    .format(len(temps)))
             temp_allocation[tmp] = reg
         self._function_code._pool.set_temp_allocation(temp_allocation)
 
@@ -66,14 +85,15 @@ class AllInMemAllocator(Allocator):
         s3 (to store the values of temporaries before the actual
         instruction).
         """
+        temps = self.used_temps()
         self._function_code._pool.set_temp_allocation(
             {temp: self._function_code.new_offset(FP)
-             for temp in self._function_code._pool._all_temps})
+             for temp in temps})
         self._function_code._stacksize = self._function_code.get_offset()
         if self._function_code._stacksize > 234:
             raise AllocationError(
                     "Too many temporaries ({}) for the all in memory allocation, sorry."
-                    .format(len(self._function_code._pool._all_temps)))
+                    .format(len(temps)))
 
     def rewriteCode(self, listcode):
         # Finally, modify the code to replace temporaries with
@@ -10,26 +10,105 @@ from typing import Union, Any, Dict, List, Set, cast
 
 from TP04.APIRiscV import LinearCode
 from TP04.Operands import (
-    Immediate, Offset, Temporary, Function, A0, S, T)
+    Immediate, Offset, Temporary, TempSet, Function, A0, S, T)
 from TP04.Instruction3A import (
-    regset_to_string, Instruction,
+    regset_to_string, rewrite_instructions, Instruction,
     Instru3A, Jump, CondJump, Comment, Label
 )
+from TP04.PackedInstructions import PackedInstructions
+
+
+class Adjacency:
+    """Predecessors or successors of a block: an ordered multiset of blocks
+    with O(1) append, remove and membership, usable as a list (iteration,
+    len, indexing through a cached list view)."""
+
+    __slots__ = ('_count', '_list')
+
+    def __init__(self):
+        self._count: Dict[Block, int] = dict()
+        self._list: Union[List[Block], None] = None
+
+    def append(self, b: 'Block') -> None:
+        self._count[b] = self._count.get(b, 0) + 1
+        self._list = None
+
+    def remove(self, b: 'Block') -> None:
+        n = self._count[b]  # KeyError, like ValueError for lists
+        if n == 1:
+            del self._count[b]
+        else:
+            self._count[b] = n - 1
+        self._list = None
+
+    def as_list(self) -> List['Block']:
+        """The blocks, as a list (do not modify it)."""
+        if self._list is None:
+            self._list = [b for b, n in self._count.items() for _ in range(n)]
+        return self._list
+
+    def __contains__(self, b) -> bool:
+        return b in self._count
+
+    def __iter__(self):
+        return iter(self.as_list())
+
+    def __len__(self) -> int:
+        return len(self.as_list())
+
+    def __bool__(self) -> bool:
+        return bool(self._count)
+
+    def __getitem__(self, i):
+        return self.as_list()[i]
+
+    def __repr__(self):
+        return repr(self.as_list())
 
 
 class Block:
 
+    __slots__ = ('_label', '_id', '_ins_list', '_packed', '_in', '_out', '_gen', '_kill')
+
     def __init__(self, label, insts):
         self._label: Label = label
-        self._listIns: List[Instruction] = insts
-        self._in: List[Block] = []
-        self._out: List[Block] = []
-        self._gen = set()
-        self._kill = set()
+        self._id = -1  # Index in the CFG, set by CFG.add_block
+        self._packed: Union[PackedInstructions, None] = None
+        self._ins_list: List[Instruction] = insts
+        self._in: Adjacency = Adjacency()
+        self._out: Adjacency = Adjacency()
+        self._gen = TempSet()
+        self._kill = TempSet()
+
+    @property
+    def _listIns(self) -> List[Instruction]:
+        """The instructions, unpacked first if the block is packed."""
+        if self._packed is not None:
+            self._ins_list = self._packed.to_list()
+            self._packed = None
+        return self._ins_list
+
+    @_listIns.setter
+    def _listIns(self, insts: List[Instruction]):
+        self._ins_list = insts
+        self._packed = None
+
+    def pack(self, pool=None):
+        """Store the instructions as a PackedInstructions (struct of arrays)
+        until they are accessed again as objects (with get_instructions or
+        _listIns), which creates new instruction objects: the objects
+        obtained before pack (e.g. the keys of a liveness result) are no
+        longer those of the block. set_gen_kill works on the arrays."""
+        if self._packed is None:
+            self._packed = PackedInstructions(self._ins_list, pool)
+            self._ins_list = []
+
+    def is_packed(self) -> bool:
+        return self._packed is not None
 
     def __str__(self):
-        instr = [i for i in self._listIns if not isinstance(i, Comment)]
-        instr_str = '\n'.join(map(str, instr))
+        instr_str = '\n'.join(str(i) for i in self._listIns
+                              if not isinstance(i, Comment))
         s = '{}\n\n{}'.format(self._label, instr_str)
         return s
 
@@ -42,52 +121,44 @@ class Block:
     def get_label(self) -> Label:
         return self._label
 
+    def get_id(self) -> int:
+        """Index of the block in its CFG (0, 1, ... in order of addition)."""
+        return self._id
+
     def get_jump(self) -> Union[Jump, CondJump, None]:
-        # Get rid of comments
-        instr = [i for i in self.get_instructions() if i.is_instruction()]
-        if instr:
-            j = instr[-1]
-            if j.is_jump():
-                return cast(Union[Jump, CondJump], j)
-            else:
+        # Last real instruction, skipping the trailing comments if any
+        for j in reversed(self._listIns):
+            if j.is_instruction():
+                if j.is_jump():
+                    return cast(Union[Jump, CondJump], j)
                 return None
-        else:
-            return None
+        return None
 
-    def iter_instructions(self, f):
+    def iter_instructions(self, f, comments=True):
         """Iterate over instructions.
         For each real instruction (not label or comment), call f,
         which must return either None or a list of instruction. If it
         returns None, nothing happens. If it returns a list, then the
-        instruction is replaced by this list.
+        instruction is replaced by this list, surrounded by comments if
+        comments is True.
         """
-        i = 0
-        while i < len(self._listIns):
-            old_i = self._listIns[i]
-            if not old_i.is_instruction():
-                i += 1
-                continue
-            new_i_list = f(old_i)
-            if new_i_list is None:
-                i += 1
-                continue
-            del self._listIns[i]
-            self._listIns.insert(i, Comment(str(old_i)))
-            i += 1
-            for new_i in new_i_list:
-                self._listIns.insert(i, new_i)
-                i += 1
-            self._listIns.insert(i, Comment("end " + str(old_i)))
-            i += 1
+        self._listIns[:] = rewrite_instructions(self._listIns, f, comments)
 
     def set_gen_kill(self):
-        gen = set()
-        kill = set()
+        if self._packed is not None:
+            pool = self._packed._pool
+            gen_bits, kill_bits = self._packed.gen_kill()
+            self._gen = TempSet(pool=pool, bits=gen_bits)
+            self._kill = TempSet(pool=pool, bits=kill_bits)
+            return
+        gen = TempSet()
+        kill = TempSet()
         for i in self.get_instructions():
             if i.is_instruction():
                 # Reminder: '|' is set union, '-' is subtraction.
-                kill = kill | set(i.defined())
-                gen = (gen | set(i.used())) - kill
+                # Uses before any definition in the block are live-in.
+                gen |= TempSet(i.used()) - kill
+                kill.update(i.defined())
         self._gen = gen
         self._kill = kill
 
@@ -107,6 +178,11 @@ class CFG:
 
     def __init__(self, function):
         self._listBlk = {}
+        # Blocks by id, and cached views, reset when the graph changes
+        self._blocks: List[Block] = []
+        self._blocks_view: Union[List[Block], None] = None
+        self._entries: Union[List[Block], None] = None
+        self._dfs: Union[DFSTree, None] = None
         self._dec = function._dec
         self._nblabel = function._nblabel
         self._pool = function._pool
@@ -115,6 +191,7 @@ class CFG:
         self._init_blks(function._label_div_by_zero)
         self._add_blocks(function)
         self._end: Label = self.new_label("end")
+        self._asm_comments = function._asm_comments
 
     def _init_blks(self, label_div_by_zero):
         label_div_by_zero_msg = Label(label_div_by_zero._name + "_msg")
@@ -182,31 +259,81 @@ class CFG:
             prev_block = block
         self._start = blocks[0]._label
 
+    def _changed(self) -> None:
+        """Invalidate the cached views of the graph."""
+        self._entries = None
+        self._dfs = None
+
     def add_block(self, blk: Block):
         """Add a new block"""
+        assert blk._label not in self._listBlk
+        blk._id = len(self._blocks)
+        self._blocks.append(blk)
+        self._blocks_view = None
         self._listBlk[blk._label] = blk
+        self._changed()
 
     def get_block(self, name: Label):
         """Return the block with label `name`"""
         return self._listBlk[name]
 
+    def get_block_by_id(self, id: int) -> Block:
+        """Return the block of id `id` (see Block.get_id)"""
+        return self._blocks[id]
+
+    def nb_blocks(self) -> int:
+        return len(self._blocks)
+
     def get_blocks(self) -> List[Block]:
-        """Return all the blocks"""
-        return [b for (_, b) in self._listBlk.items()]
+        """Return all the blocks, in order of id (do not modify the list).
+        The list is cached: it is not affected by blocks added later."""
+        if self._blocks_view is None:
+            self._blocks_view = list(self._blocks)
+        return self._blocks_view
 
     def get_entries(self) -> List[Block]:
         """Return all the blocks with no predecessors"""
-        return [b for (_, b) in self._listBlk.items() if not b._in]
+        if self._entries is None:
+            self._entries = [b for b in self._blocks if not b._in]
+        return self._entries
 
     def add_edge(self, src: Block, dest: Block) -> None:
         """Add edge src -> dest in the control flow graph"""
         dest._in.append(src)
         src._out.append(dest)
+        self._changed()
 
     def remove_edge(self, src: Block, dest: Block) -> None:
         """Remove edge src -> dest in the control flow graph"""
         dest._in.remove(src)
         src._out.remove(dest)
+        self._changed()
+
+    def has_edge(self, src: Block, dest: Block) -> bool:
+        """True if there is an edge src -> dest, in constant time"""
+        return dest in src._out
+
+    def dfs_tree(self) -> 'DFSTree':
+        """The depth-first search of the CFG from the start block, cached
+        until the CFG is modified."""
+        if self._dfs is None:
+            self._dfs = DFSTree(self)
+        return self._dfs
+
+    def reverse_postorder(self) -> List[Block]:
+        """All the blocks in reverse postorder (the best order for forward
+        analyses): a block comes before its successors, except along back
+        edges. Do not modify the list."""
+        return self.dfs_tree().rpo
+
+    def postorder(self) -> List[Block]:
+        """All the blocks in postorder (the best order for backward
+        analyses). Do not modify the list."""
+        return self.dfs_tree().postorder
+
+    def dfs_preorder(self) -> List[Block]:
+        """All the blocks in DFS preorder. Do not modify the list."""
+        return self.dfs_tree().preorder
 
     def gather_defs(self) -> Dict[Any, Set[Block]]:
         """
@@ -256,7 +383,17 @@ class CFG:
 
     def iter_instructions(self, f):
         for b in self.get_blocks():
-            b.iter_instructions(f)
+            b.iter_instructions(f, self._asm_comments)
+
+    def pack(self):
+        """Store the instructions of all blocks as integer arrays, see
+        Block.pack."""
+        for b in self.get_blocks():
+            b.pack(self._pool)
+
+    def set_asm_comments(self, enable):
+        """Enable or disable comments in rewritten code."""
+        self._asm_comments = enable
 
     def ordered_blocks_list(self) -> List[Block]:
         """
@@ -275,8 +412,7 @@ class CFG:
         for j, block in enumerate(blocks):
             label = block._label
             l.append(label)
-            for i in block._listIns:
-                l.append(i)
+            l.extend(block._listIns)
             if len(block._out) == 0:
                 l.append(Jump(self._end))
             else:
@@ -347,3 +483,47 @@ class CFG:
         gz.render('dot', 'pdf', filename)
         if view:
             gz.view(filename + '.pdf')
+
+
+class DFSTree:
+    """Depth-first spanning tree of a CFG, from its start block, then from
+    the other blocks with no predecessors, then from the remaining blocks
+    unreachable from them (in order of id).
+
+    - preorder, postorder, rpo: all the blocks in each order;
+    - parent[b]: parent of b in the spanning tree (None for roots);
+    - pre[b], post[b]: preorder and postorder numbers of b.
+    """
+
+    def __init__(self, cfg: CFG):
+        self.preorder: List[Block] = []
+        self.postorder: List[Block] = []
+        self.parent: Dict[Block, Union[Block, None]] = dict()
+        self.pre: Dict[Block, int] = dict()
+        self.post: Dict[Block, int] = dict()
+        roots = [cfg.get_block(cfg._start)] + cfg.get_entries() + cfg.get_blocks()
+        for root in roots:
+            if root in self.pre:
+                continue
+            self._visit(root)
+        self.rpo: List[Block] = self.postorder[::-1]
+
+    def _visit(self, root: Block) -> None:
+        """Iterative DFS from root."""
+        self.parent[root] = None
+        self.pre[root] = len(self.preorder)
+        self.preorder.append(root)
+        stack = [(root, iter(root._out))]
+        while stack:
+            block, succs = stack[-1]
+            for succ in succs:
+                if succ not in self.pre:
+                    self.parent[succ] = block
+                    self.pre[succ] = len(self.preorder)
+                    self.preorder.append(succ)
+                    stack.append((succ, iter(succ._out)))
+                    break
+            else:
+                stack.pop()
+                self.post[block] = len(self.postorder)
+                self.postorder.append(block)
@@ -0,0 +1,204 @@
+"""
+CAP, Dataflow analyses
+Generic worklist solver for bit-vector dataflow problems on a CFG, and
+some of its clients (reaching definitions, available expressions).
+Liveness for the non-SSA allocator is in LivenessDataFlow.py.
+"""
+
+import heapq
+from typing import Callable, Dict, List, Tuple
+from TP05.CFG import (Block, CFG)
+from TP04.Instruction3A import (Instruction, Instru3A, Opcode)
+
+# Meet operators on bit-vectors
+MAY = 'may'    # union, e.g. liveness, reaching definitions
+MUST = 'must'  # intersection, e.g. available expressions
+
+
+class DataFlow:
+    """Worklist solver for a bit-vector dataflow problem.
+
+    Sets are Python ints used as bit-vectors over a universe of facts
+    (temporaries, definitions, expressions...) numbered by the client.
+    For each block b, gen(b) and kill(b) give the local effect of b, and
+    the transfer function is out = gen | (in & ~kill), where in/out are
+    taken in the direction of the analysis.
+
+    - forward: True for forward problems (in = meet of the predecessors),
+      False for backward ones (out = meet of the successors);
+    - meet: MAY (union) or MUST (intersection);
+    - universe: bit-vector of all the facts, initial value of MUST problems;
+    - boundary: value at the entry (forward) or exits (backward).
+
+    After run(), get_in(b) and get_out(b) give the bit-vectors at the
+    beginning and end of block b, in program order.
+    """
+
+    def __init__(self, function: CFG, forward: bool, meet: str,
+                 gen: Callable[[Block], int], kill: Callable[[Block], int],
+                 universe: int = 0, boundary: int = 0):
+        assert meet in (MAY, MUST)
+        self._function = function
+        self._forward = forward
+        self._meet = meet
+        self._gen_fun = gen
+        self._kill_fun = kill
+        self._universe = universe
+        self._boundary = boundary
+        # Values before and after each block, in the direction of the analysis
+        self._before: Dict[Block, int] = dict()
+        self._after: Dict[Block, int] = dict()
+        self.iterations = 0
+
+    def run(self) -> None:
+        if self._forward:
+            order = self._function.reverse_postorder()
+        else:
+            order = self._function.postorder()
+        rank = {b: i for i, b in enumerate(order)}
+        gen = {b: self._gen_fun(b) for b in order}
+        notkill = {b: ~self._kill_fun(b) for b in order}
+        if self._forward:
+            preds = {b: b._in for b in order}
+            succs = {b: b._out for b in order}
+        else:
+            preds = {b: b._out for b in order}
+            succs = {b: b._in for b in order}
+        init = self._universe if self._meet == MUST else 0
+        for b in order:
+            self._before[b] = self._boundary if not preds[b] else init
+            self._after[b] = gen[b] | (self._before[b] & notkill[b])
+        # Worklist, by rank in the iteration order
+        worklist = list(range(len(order)))
+        pending = set(order)
+        union = self._meet == MAY
+        while worklist:
+            b = order[heapq.heappop(worklist)]
+            pending.discard(b)
+            self.iterations += 1
+            if preds[b]:
+                values = [self._after[p] for p in preds[b]]
+                before = values[0]
+                for v in values[1:]:
+                    before = before | v if union else before & v
+                self._before[b] = before
+            after = gen[b] | (self._before[b] & notkill[b])
+            if after != self._after[b]:
+                self._after[b] = after
+                for s in succs[b]:
+                    if s not in pending:
+                        pending.add(s)
+                        heapq.heappush(worklist, rank[s])
+
+    def get_in(self, block: Block) -> int:
+        """Bit-vector at the beginning of block."""
+        return self._before[block] if self._forward else self._after[block]
+
+    def get_out(self, block: Block) -> int:
+        """Bit-vector at the end of block."""
+        return self._after[block] if self._forward else self._before[block]
+
+
+def bits_to_list(bits: int, facts: List) -> List:
+    """The facts whose bit is set in bits."""
+    res = []
+    while bits:
+        low = bits & -bits
+        res.append(facts[low.bit_length() - 1])
+        bits ^= low
+    return res
+
+
+class ReachingDefinitions:
+    """Reaching definitions: which instructions defining a temporary may
+    reach the beginning of each block without being overwritten."""
+
+    def __init__(self, function: CFG):
+        self._function = function
+        # Definitions: (block, instruction, temporary), numbered
+        self._defs: List[Tuple[Block, Instruction, object]] = []
+        self._defs_of: Dict[object, int] = dict()  # temporary -> bits
+        self._gen: Dict[Block, int] = dict()
+        for b in function.get_blocks():
+            last: Dict[object, int] = dict()
+            for i in b.get_instructions():
+                for v in i.defined():
+                    bit = 1 << len(self._defs)
+                    self._defs.append((b, i, v))
+                    self._defs_of[v] = self._defs_of.get(v, 0) | bit
+                    last[v] = bit
+            self._gen[b] = sum(last.values())
+        self._dataflow = DataFlow(function, True, MAY, self._gen.__getitem__,
+                                  self.kill)
+
+    def kill(self, block: Block) -> int:
+        bits = 0
+        for i in block.get_instructions():
+            for v in i.defined():
+                bits |= self._defs_of[v]
+        return bits
+
+    def run(self) -> None:
+        self._dataflow.run()
+
+    def reaching_in(self, block: Block) -> List[Tuple[Block, Instruction, object]]:
+        """Definitions (block, instruction, temporary) reaching the
+        beginning of block."""
+        return bits_to_list(self._dataflow.get_in(block), self._defs)
+
+
+class AvailableExpressions:
+    """Available expressions: which computations (opcode, operands) have
+    been computed on every path to the beginning of each block, with no
+    operand redefined since."""
+
+    def __init__(self, function: CFG):
+        self._function = function
+        self._exprs: List[Tuple] = []  # (opcode name, source operands)
+        self._index: Dict[Tuple, int] = dict()
+        self._uses_of: Dict[object, int] = dict()  # operand -> expressions
+        for b in function.get_blocks():
+            for i in b.get_instructions():
+                expr = self.expression(i)
+                if expr is not None and expr not in self._index:
+                    bit = 1 << len(self._exprs)
+                    self._index[expr] = len(self._exprs)
+                    self._exprs.append(expr)
+                    for op in expr[1]:
+                        self._uses_of[op] = self._uses_of.get(op, 0) | bit
+        self._dataflow = DataFlow(function, True, MUST, self.gen, self.kill,
+                                  universe=(1 << len(self._exprs)) - 1)
+
+    @staticmethod
+    def expression(i: Instruction):
+        """The expression computed by i, None if i is not a computation."""
+        if not isinstance(i, Instru3A) or i.is_read_only() or i.has_side_effects():
+            return None
+        if i.get_opcode() in (Opcode.MV, Opcode.LI, Opcode.LA):
+            return None
+        return (i.get_name(), tuple(i.args[1:]))
+
+    def gen(self, block: Block) -> int:
+        bits = 0
+        for i in block.get_instructions():
+            expr = self.expression(i)
+            if expr is not None:
+                bits |= 1 << self._index[expr]
+            for v in i.defined():
+                bits &= ~self._uses_of.get(v, 0)
+        return bits
+
+    def kill(self, block: Block) -> int:
+        bits = 0
+        for i in block.get_instructions():
+            for v in i.defined():
+                bits |= self._uses_of.get(v, 0)
+        return bits
+
+    def run(self) -> None:
+        self._dataflow.run()
+
+    def available_in(self, block: Block) -> List[Tuple]:
+        """Expressions (opcode name, operands) available at the beginning
+        of block."""
+        return bits_to_list(self._dataflow.get_in(block), self._exprs)
@@ -0,0 +1,342 @@
+"""
+CAP, SSA Intro
+Dominance on a CFG from immediate dominators, shared by SSA.py and
+SSA-correct.py: the dominator sets, the dominator tree and the dominance
+queries are derived from the idom table.
+"""
+
+import heapq
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from collections.abc import Mapping
+from TP05.CFG import (Block, CFG)
+
+
+# Algorithms for computeIdom
+CHK = 'chk'            # Cooper, Harvey, Kennedy: iterative
+SEMI_NCA = 'semi-nca'  # Lengauer-Tarjan semi-dominators, then NCA
+AUTO = 'auto'          # by size of the CFG, see SEMI_NCA_THRESHOLD
+
+# From this number of blocks, AUTO picks SEMI_NCA. Below, both take well
+# under a millisecond and CHK, the simpler one, is used. CHK can be
+# quadratic on deep dominator trees (long chains of nested loops or ifs),
+# whereas SEMI_NCA is almost linear (see MiniCPassBench.py --dominators).
+SEMI_NCA_THRESHOLD = 64
+
+
+def computeIdom(function: CFG, algorithm=AUTO) -> Dict[Block, Optional[Block]]:
+    """
+    `computeIdom(function)` computes the immediate dominator of each block
+    of `function`, None for the roots of the depth-first search (the
+    start block, and the blocks unreachable from it). As in computeDom, a
+    block reachable from an entry (start block or block without
+    predecessors) is only dominated along the paths from the entries: its
+    predecessors unreachable from the entries (dead loops) are ignored.
+
+    `algorithm` is CHK, SEMI_NCA or AUTO; all give the same result.
+    """
+    if algorithm == AUTO:
+        if function.nb_blocks() >= SEMI_NCA_THRESHOLD:
+            algorithm = SEMI_NCA
+        else:
+            algorithm = CHK
+    if algorithm == CHK:
+        return _idom_chk(function)
+    if algorithm == SEMI_NCA:
+        return _idom_semi_nca(function)
+    raise ValueError("Unknown dominator algorithm: {}".format(algorithm))
+
+
+def _reachable(function: CFG) -> Set[Block]:
+    """The blocks reachable from an entry (start block or block without
+    predecessors)."""
+    # The entries are the first roots of the DFS: the blocks of their
+    # trees are the ones reachable from an entry
+    dfs = function.dfs_tree()
+    entries = set(function.get_entries())
+    entries.add(function.get_block(function._start))
+    reachable: Set[Block] = set()
+    for b in dfs.preorder:
+        parent = dfs.parent[b]
+        if (b in entries) if parent is None else (parent in reachable):
+            reachable.add(b)
+    return reachable
+
+
+def _live_preds(function: CFG, dfs) -> Dict[Block, List[Block]]:
+    """The predecessors of each block that matter for dominance: all of
+    them, except the ones unreachable from the entries when the block is
+    reachable."""
+    reachable = _reachable(function)
+    return {b: [p for p in b._in if p in reachable] if b in reachable
+            else list(b._in)
+            for b in dfs.preorder}
+
+
+def _idom_chk(function: CFG) -> Dict[Block, Optional[Block]]:
+    """Cooper, Harvey, Kennedy, "A Simple, Fast Dominance Algorithm": the
+    idom of a block is the nearest common ancestor, in the current tree,
+    of its processed predecessors, found by walking two "fingers" up the
+    tree by postorder number. Iterating in reverse postorder converges in
+    a couple of rounds on reducible CFGs."""
+    dfs = function.dfs_tree()
+    preds = _live_preds(function, dfs)
+    post = dict(dfs.post)
+    # The roots hang from a virtual root (None), after every block
+    post[None] = len(dfs.postorder)  # type: ignore
+    idom: Dict[Block, Optional[Block]] = {
+        b: None for b in dfs.rpo if dfs.parent[b] is None}
+
+    def intersect(b1: Optional[Block], b2: Optional[Block]) -> Optional[Block]:
+        while b1 is not b2:
+            while post[b1] < post[b2]:  # type: ignore
+                b1 = idom[b1]  # type: ignore
+            while post[b2] < post[b1]:  # type: ignore
+                b2 = idom[b2]  # type: ignore
+        return b1
+
+    changed = True
+    while changed:
+        changed = False
+        for b in dfs.rpo:
+            if dfs.parent[b] is None:
+                continue
+            # The parent in the DFS tree comes before b in RPO
+            new_idom = dfs.parent[b]
+            for p in preds[b]:
+                if p is not new_idom and p in idom:
+                    new_idom = intersect(p, new_idom)
+            if b not in idom or idom[b] is not new_idom:
+                idom[b] = new_idom
+                changed = True
+    return idom
+
+
+def _idom_semi_nca(function: CFG) -> Dict[Block, Optional[Block]]:
+    """Semi-NCA (Georgiadis, Tarjan): the semi-dominators of Lengauer and
+    Tarjan, computed in reverse preorder with a path-compressed forest,
+    then the idom of each block in preorder as the nearest ancestor of
+    its DFS parent whose number is at most its semi-dominator.
+    Blocks are numbered by preorder; -1 is the virtual root above the
+    roots of the DFS."""
+    dfs = function.dfs_tree()
+    preds = _live_preds(function, dfs)
+    order = dfs.preorder
+    pre = dfs.pre
+    n = len(order)
+    parent = [-1] * n
+    tree = list(range(n))  # Number of the DFS root of the tree of each block
+    for w, b in enumerate(order):
+        if dfs.parent[b] is not None:
+            parent[w] = pre[dfs.parent[b]]  # type: ignore
+            tree[w] = tree[parent[w]]
+    semi = list(range(n))
+    label = list(range(n))
+    ancestor = [-1] * n  # Link-eval forest of the processed blocks
+
+    def evaluate(v: int) -> int:
+        if ancestor[v] < 0:
+            return v
+        # Path compression, without recursion
+        path = []
+        u = v
+        while ancestor[ancestor[u]] >= 0:
+            path.append(u)
+            u = ancestor[u]
+        while path:
+            u = path.pop()
+            a = ancestor[u]
+            if semi[label[a]] < semi[label[u]]:
+                label[u] = label[a]
+            ancestor[u] = ancestor[a]
+        return label[v]
+
+    for w in range(n - 1, -1, -1):
+        if parent[w] < 0:
+            continue
+        for p in preds[order[w]]:
+            v = pre[p]
+            if tree[v] != tree[w]:
+                # Path from another root: only the virtual root dominates
+                semi[w] = -1
+                break
+            s = semi[evaluate(v)]
+            if s < semi[w]:
+                semi[w] = s
+        ancestor[w] = parent[w]
+
+    idom = parent[:]
+    for w in range(n):
+        if parent[w] >= 0:
+            d = parent[w]
+            while d > semi[w]:
+                d = idom[d]
+            idom[w] = d
+    return {b: order[idom[w]] if idom[w] >= 0 else None
+            for w, b in enumerate(order)}
+
+
+class DominatorTree(Mapping):
+    """Dominance queries on a function, from its immediate dominators.
+
+    The domination tree is numbered by a depth-first traversal (entry and
+    exit times), so that dominates(a, b) is two integer comparisons: a
+    dominates b iff the interval of b is nested in the interval of a.
+
+    For the code written for computeDom, a DominatorTree is also the table
+    associating each block to the set of its dominators (itself included):
+    the set of a block is computed on its first access by walking up the
+    idom chain.
+    """
+
+    def __init__(self, function: CFG, idom: Dict[Block, Optional[Block]]):
+        self._idom = idom
+        self._DT = idom_to_DT(function, idom)
+        self._sets: Dict[Block, Set[Block]] = dict()
+        self._enter: Dict[Block, int] = dict()
+        self._exit: Dict[Block, int] = dict()
+        self._level: Dict[Block, int] = dict()  # Depth in the tree
+        # Blocks unreachable from the entries (see computeIdom): their
+        # edges to reachable blocks are ignored by the frontiers
+        reachable = _reachable(function)
+        self._dead: Set[Block] = {b for b in idom if b not in reachable}
+        time = 0
+        for root in function.get_blocks():
+            if idom[root] is not None:
+                continue
+            self._enter[root] = time
+            self._level[root] = 0
+            time += 1
+            stack = [(root, iter(self._DT[root]))]
+            while stack:
+                b, children = stack[-1]
+                for c in children:
+                    self._enter[c] = time
+                    self._level[c] = self._level[b] + 1
+                    time += 1
+                    stack.append((c, iter(self._DT[c])))
+                    break
+                else:
+                    stack.pop()
+                    self._exit[b] = time
+                    time += 1
+
+    def get_idom(self, b: Block) -> Optional[Block]:
+        """The immediate dominator of b, None for a root."""
+        return self._idom[b]
+
+    def get_DT(self) -> Dict[Block, Set[Block]]:
+        """The domination tree, as returned by computeDT."""
+        return self._DT
+
+    def dominates(self, a: Block, b: Block) -> bool:
+        """True if a dominates b (a block dominates itself)."""
+        return (self._enter[a] <= self._enter[b]
+                and self._exit[b] <= self._exit[a])
+
+    def strictly_dominates(self, a: Block, b: Block) -> bool:
+        """True if a dominates b and a is not b."""
+        return a is not b and self.dominates(a, b)
+
+    def frontiers(self) -> Dict[Block, Set[Block]]:
+        """The dominance frontier of every block, as returned by computeDF.
+
+        Runner algorithm (Cytron et al., as presented by Cooper, Harvey,
+        Kennedy): for each edge p -> b, b is in the frontier of p and of
+        its dominators, up to the immediate dominator of b excluded.
+        No recursion, and no set but the frontiers themselves.
+        """
+        DF: Dict[Block, Set[Block]] = {b: set() for b in self._idom}
+        for b in self._idom:
+            idom_b = self._idom[b]
+            for p in b._in:
+                if p in self._dead and b not in self._dead:
+                    continue
+                runner: Optional[Block] = p
+                while runner is not idom_b and runner is not None:
+                    DF[runner].add(b)
+                    runner = self._idom[runner]
+        return DF
+
+    def iterated_frontier(self, blocks: Iterable[Block],
+                          live_in: Optional[Set[Block]] = None) -> List[Block]:
+        """The iterated dominance frontier of blocks, i.e. the blocks
+        where a variable defined in blocks needs a phi node, without
+        computing the frontiers of all the blocks.
+
+        Sreedhar and Gao, on the DJ-graph (domination tree edges plus the
+        CFG edges that are not in the tree): the blocks are visited by
+        decreasing depth in the tree; from each one, the subtree below is
+        walked (each block at most once overall), and the targets of its
+        CFG edges that are not deeper than the root of the walk are in the
+        frontier, and become roots themselves.
+
+        With live_in, the blocks where a variable is live at the beginning,
+        only these blocks are kept (pruned SSA).
+        """
+        defs = set(blocks)
+        level, enter = self._level, self._enter
+        # Blocks to walk from, deepest first
+        roots = [(-level[b], enter[b], b) for b in defs]
+        heapq.heapify(roots)
+        walked = set(defs)
+        in_idf: Set[Block] = set()
+        idf: List[Block] = []
+        while roots:
+            root_level, _, root = heapq.heappop(roots)
+            root_level = -root_level
+            walked.add(root)
+            stack = [root]
+            while stack:
+                b = stack.pop()
+                dead = b in self._dead
+                for succ in b._out:
+                    if level[succ] > root_level or succ in in_idf:
+                        continue
+                    if dead and succ not in self._dead:
+                        continue
+                    if live_in is not None and succ not in live_in:
+                        continue
+                    in_idf.add(succ)
+                    idf.append(succ)
+                    if succ not in defs:
+                        heapq.heappush(roots, (-level[succ], enter[succ], succ))
+                for c in self._DT[b]:
+                    if c not in walked:
+                        walked.add(c)
+                        stack.append(c)
+        return idf
+
+    def __getitem__(self, b: Block) -> Set[Block]:
+        doms = self._sets.get(b)
+        if doms is None:
+            if b not in self._idom:
+                raise KeyError(b)
+            doms = set()
+            d: Optional[Block] = b
+            while d is not None:
+                doms.add(d)
+                d = self._idom[d]
+            self._sets[b] = doms
+        return doms
+
+    def __iter__(self) -> Iterator[Block]:
+        return iter(self._idom)
+
+    def __len__(self) -> int:
+        return len(self._idom)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+def idom_to_DT(function: CFG, idom: Dict[Block, Optional[Block]]) -> Dict[Block, Set[Block]]:
+    """
+    `idom_to_DT(function, idom)` returns the domination tree of `function`
+    (like computeDT), a dictionnary which associates a node with its
+    children, by inverting the idom relation.
+    """
+    DT: Dict[Block, Set[Block]] = {b: set() for b in function.get_blocks()}
+    for b, d in idom.items():
+        if d is not None:
+            DT[d].add(b)
+    return DT
@@ -0,0 +1,283 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+CAP, 3-address code interpreter.
+Directly runs a LinearCode or a CFG (in SSA form or not, with temporaries
+or after allocation), to check the middle-end passes without assembling
+and simulating the RiscV code.
+"""
+
+from typing import Dict, List, Optional, Tuple, Union
+from Errors import MiniCRuntimeError, MiniCInternalError
+from OutputChannel import OutputChannel
+from TP04.APIRiscV import LinearCode
+from TP04.Operands import (
+    Operand, Immediate, Offset, Register, Function, ZERO, A0)
+from TP04.Instruction3A import Instruction, Instru3A, Label
+from TP05.CFG import Block, CFG
+from TP05.SSA import PhiNode
+
+
+XLEN = 64
+
+
+def wrap(v: int) -> int:
+    """Truncate an integer to a signed 64-bit RiscV value."""
+    v &= (1 << XLEN) - 1
+    return v - (1 << XLEN) if v >> (XLEN - 1) else v
+
+
+def div_rd_0(a: int, b: int) -> int:
+    """ Division rounded towards 0 (integer division in Python rounds down). """
+    return -(-a // b) if (a < 0) ^ (b < 0) else a // b
+
+
+def mod_rd_0(a: int, b: int) -> int:
+    """ Modulo rounded towards 0 (integer division in Python rounds down). """
+    return -(-a % b) if (a < 0) ^ (b < 0) else a % b
+
+
+ARITH = {
+    'add': lambda a, b: a + b,
+    'addi': lambda a, b: a + b,
+    'sub': lambda a, b: a - b,
+    'mul': lambda a, b: a * b,
+    'and': lambda a, b: a & b,
+    'or': lambda a, b: a | b,
+    'xor': lambda a, b: a ^ b,
+}
+
+COND = {
+    'blt': lambda a, b: a < b,
+    'bgt': lambda a, b: a > b,
+    'beq': lambda a, b: a == b,
+    'bne': lambda a, b: a != b,
+    'ble': lambda a, b: a <= b,
+    'bge': lambda a, b: a >= b,
+}
+
+
+# Value of a location that was never written
+UNDEF = object()
+
+
+class Exit(Exception):
+    """Raised by the exit builtin to stop the interpretation."""
+
+    def __init__(self, code):
+        self.code = code
+
+
+class IRInterpreter:
+    """Interpreter for the 3-address code of one function.
+
+    Temporaries, registers and stack slots all live in the same store.
+    PhiNodes are evaluated in parallel at the entry of a block, using the
+    label of the block we came from. Only the builtins println_int,
+    println_string and exit are supported.
+
+    Usage:
+        interp = IRInterpreter(cfg, output=OutputChannel.capture())
+        exitcode = interp.run()
+    """
+
+    _code: Union[LinearCode, CFG]
+    _store: Dict[object, object]
+
+    def __init__(self, code: Union[LinearCode, CFG],
+                 output: Optional[OutputChannel] = None,
+                 max_steps=10000000):
+        self._code = code
+        self._output = output if output is not None else OutputChannel.stdout()
+        self._max_steps = max_steps
+        self._store = dict()
+        self._strings: Dict[Label, str] = dict()
+        # Number of real instructions executed (phis excluded)
+        self.steps = 0
+
+    # Operand access
+
+    def _key(self, op: Operand):
+        if isinstance(op, Offset):
+            return (str(op._basereg), op.get_offset())
+        if isinstance(op, Register):
+            return op._number
+        return op
+
+    def read(self, op: Operand) -> object:
+        """Value of op. Reading a location never written gives UNDEF: it
+        can be copied around (e.g. by the phis of a non-pruned SSA form)
+        but not computed with."""
+        if isinstance(op, Immediate):
+            return op._val
+        if op == ZERO:
+            return 0
+        if isinstance(op, Label):
+            return op
+        return self._store.get(self._key(op), UNDEF)
+
+    def write(self, op: Operand, v: object) -> None:
+        if op == ZERO:
+            return
+        self._store[self._key(op)] = v
+
+    def read_int(self, op: Operand) -> int:
+        v = self.read(op)
+        if v is UNDEF:
+            raise MiniCRuntimeError("{} has no value yet!".format(op))
+        if not isinstance(v, int):
+            raise MiniCInternalError("{} does not hold an integer".format(op))
+        return v
+
+    # Instructions
+
+    def call(self, function: Function) -> None:
+        name = str(function)
+        if name == "println_int":
+            self._output.println(str(self.read_int(A0)))
+        elif name == "println_string":
+            lbl = self.read(A0)
+            if not isinstance(lbl, Label) or lbl not in self._strings:
+                raise MiniCInternalError("println_string on a non-string: {}"
+                                         .format(lbl))
+            self._output.println(self._strings[lbl])
+        elif name == "exit":
+            raise Exit(self.read_int(A0))
+        else:
+            raise MiniCInternalError("Unknown function {}".format(name))
+
+    def execute(self, ins: Instru3A) -> Optional[Label]:
+        """Execute one instruction. Return the label to jump to, if any."""
+        self.steps += 1
+        if self.steps > self._max_steps:
+            raise MiniCRuntimeError("Too many steps, infinite loop?")
+        name, args = ins.unfold()
+        if name in ARITH:
+            self.write(args[0], wrap(ARITH[name](self.read_int(args[1]),
+                                                 self.read_int(args[2]))))
+        elif name in ("div", "rem"):
+            a, b = self.read_int(args[1]), self.read_int(args[2])
+            if b == 0:  # RiscV semantics, the code checks before
+                res = -1 if name == "div" else a
+            else:
+                res = div_rd_0(a, b) if name == "div" else mod_rd_0(a, b)
+            self.write(args[0], wrap(res))
+        elif name == "not":
+            self.write(args[0], wrap(~self.read_int(args[1])))
+        elif name in ("li", "mv", "la"):
+            self.write(args[0], self.read(args[1]))
+        elif name == "ld":
+            self.write(args[0], self.read(args[1]))
+        elif name == "sd":
+            self.write(args[1], self.read(args[0]))
+        elif name in COND:
+            if COND[name](self.read_int(args[0]), self.read_int(args[1])):
+                return ins.label()
+        elif name == "beqz":
+            if self.read_int(args[0]) == 0:
+                return ins.label()
+        elif name == "bnez":
+            if self.read_int(args[0]) != 0:
+                return ins.label()
+        elif name == "j":
+            return ins.label()
+        elif name == "call":
+            self.call(args[0])
+        elif name == ".string":
+            raise MiniCInternalError("Executing data")
+        else:
+            raise MiniCInternalError("Unsupported instruction {}".format(ins))
+        return None
+
+    def run_phis(self, phis: List[PhiNode], pred: Optional[Block]) -> None:
+        """Evaluate the phis of a block in parallel."""
+        if pred is None:
+            return
+        values = []
+        for phi in phis:
+            src = phi.used().get(pred.get_label())
+            v = UNDEF if src is None else self.read(src)
+            values.append((phi.defined()[0], v))
+        for dest, v in values:
+            self.write(dest, v)
+
+    # Drivers
+
+    def run(self) -> int:
+        """Run the code, return the exit code."""
+        try:
+            if isinstance(self._code, CFG):
+                self.run_cfg(self._code)
+            else:
+                self.run_linear(self._code)
+        except Exit as e:
+            return e.code
+        return self.read_int(A0)
+
+    def run_linear(self, code: LinearCode) -> None:
+        instrs = code.get_instructions()
+        div_by_zero = code.get_label_div_by_zero()
+        msg = Label(div_by_zero._name + "_msg")
+        self._strings[msg] = "Division by 0"
+        positions = {i: n for n, i in enumerate(instrs) if isinstance(i, Label)}
+        end = len(instrs)
+        # The division by zero handler is in the postlude, after the end
+        positions[div_by_zero] = end + 1
+        instrs = instrs + [None,
+                           Instru3A("la", A0, msg),
+                           Instru3A("call", Function("println_string")),
+                           Instru3A("li", A0, Immediate(1)),
+                           Instru3A("call", Function("exit"))]
+        pc = 0
+        while pc != end:
+            ins = instrs[pc]
+            pc += 1
+            if isinstance(ins, Instru3A):
+                target = self.execute(ins)
+                if target is not None:
+                    pc = positions[target]
+
+    def run_cfg(self, cfg: CFG) -> None:
+        for b in cfg.get_blocks():
+            for i in b.get_instructions():
+                if isinstance(i, Instru3A) and i.get_name() == ".string":
+                    self._strings[b.get_label()] = str(i.args[0]).strip('"')
+        pred: Optional[Block] = None
+        block: Optional[Block] = cfg.get_block(cfg._start)
+        while block is not None:
+            instrs: List[Instruction] = block.get_instructions()
+            self.run_phis([i for i in instrs if isinstance(i, PhiNode)], pred)
+            target = None
+            for ins in instrs:
+                if isinstance(ins, Instru3A):
+                    target = self.execute(ins)
+                    if target is not None:
+                        break
+            pred, block = block, self.next_block(cfg, block, target)
+
+    def next_block(self, cfg: CFG, block: Block,
+                   target: Optional[Label]) -> Optional[Block]:
+        """The block executed after `block`, following the same convention
+        as CFG.linearize."""
+        if target is not None:
+            return cfg.get_block(target)
+        jump = block.get_jump()
+        succs = block._out
+        if jump is not None and jump.is_cond_jump():
+            succs = [b for b in succs if b.get_label() != jump.label()]
+        if not succs:
+            return None
+        assert len(succs) == 1, (block, succs)
+        return succs[0]
+
+
+def interpret(code: Union[LinearCode, CFG],
+              output: Optional[OutputChannel] = None) -> Tuple[int, int]:
+    """Run the code, return the exit code and the number of instructions
+    executed. The output is flushed in any case."""
+    interp = IRInterpreter(code, output)
+    try:
+        return interp.run(), interp.steps
+    finally:
+        interp._output.flush()
@@ -0,0 +1,69 @@
+from typing import Dict
+from TP04.Operands import TempSet
+from TP04.Instruction3A import Instruction, regset_to_string
+from TP05.CFG import Block, CFG
+from TP05.DataFlow import DataFlow, MAY
+
+
+class LivenessDataFlow:
+    """Liveness of temporaries on a CFG not in SSA form, with the generic
+    bit-vector DataFlow solver (backward, union)."""
+
+    def __init__(self, function: CFG, debug=False):
+        self._function = function
+        self._debug = debug
+        # Live temporaries at the beginning and end of blocks
+        self._in: Dict[Block, TempSet] = dict()
+        self._out: Dict[Block, TempSet] = dict()
+        # Live Operands at outputs of instructions
+        self._liveout: Dict[Instruction, TempSet] = dict()
+
+    def run(self, instructions=True):
+        """Compute the live temporaries at the beginning and end of each
+        block and, if instructions is True, after each instruction."""
+        pool = self._function._pool
+        for block in self._function.get_blocks():
+            block.set_gen_kill()
+        if self._debug:
+            self.print_gen_kill()
+        dataflow = DataFlow(self._function, False, MAY,
+                            lambda b: b._gen.bits(), lambda b: b._kill.bits())
+        dataflow.run()
+        for block in self._function.get_blocks():
+            self._in[block] = TempSet(pool=pool, bits=dataflow.get_in(block))
+            self._out[block] = TempSet(pool=pool, bits=dataflow.get_out(block))
+            if instructions:
+                self.fill_liveout(block)
+        if self._debug:
+            self.print_map_in_out()
+
+    def get_live_in(self, block: Block) -> TempSet:
+        """Temporaries live at the beginning of block."""
+        return self._in[block]
+
+    def fill_liveout(self, block: Block):
+        """Propagate the live-out set of block backward to each of its
+        instructions."""
+        live = self._out[block].copy()
+        for instr in reversed(block.get_instructions()):
+            self._liveout[instr] = live.copy()
+            if instr.is_instruction():
+                for v in instr.defined():
+                    live.discard(v)
+                live.update(instr.used())
+
+    def print_gen_kill(self):  # pragma: no cover
+        print("Dataflow Analysis, Initialisation")
+        for i, blk in enumerate(self._function.get_blocks()):
+            blk.print_gen_kill(i)
+
+    def print_map_in_out(self):  # pragma: no cover
+        """Print out sets, useful for debug!"""
+        print("In: {" +
+              ",\n ".join("\"{}\": {}".format(b._label, regset_to_string(s))
+                          for b, s in self._in.items()) +
+              "}")
+        print("Out: {" +
+              ",\n ".join("\"{}\": {}".format(b._label, regset_to_string(s))
+                          for b, s in self._out.items()) +
+              "}")
@@ -1,5 +1,5 @@
 from typing import Dict, Set, Tuple
-from TP04.Operands import Operand
+from TP04.Operands import Operand, TempSet
 from TP04.Instruction3A import Instruction, regset_to_string
 from TP05.CFG import Block
 from TP05.SSA import PhiNode
@@ -10,16 +10,16 @@ class LivenessSSA:
     def __init__(self, function, debug=False):
         self._function = function
         self._debug = debug
-        self._seen: Dict[Block, Set[Operand]] = dict()
+        self._seen: Dict[Block, TempSet] = dict()
         # Live Operands at outputs of instructions
-        self._liveout: Dict[Instruction, Set[Operand]] = dict()
+        self._liveout: Dict[Instruction, TempSet] = dict()
 
     def run(self):
         # Initialization
         for block in self._function.get_blocks():
-            self._seen[block] = set()
+            self._seen[block] = TempSet()
             for instr in block.get_instructions():
-                self._liveout[instr] = set()
+                self._liveout[instr] = TempSet()
         # Start the use-def chains
         for var, uses in self.gather_uses().items():
             for block, pos, instr in uses:
@@ -61,8 +61,7 @@ class LivenessSSA:
                 args = instr.used().values() if isinstance(instr, PhiNode) else instr.used()
                 for var in args:
                     if var is not None:
-                        var_uses = uses.get(var, set())
-                        uses[var] = var_uses.union({(block, pos, instr)})
+                        uses.setdefault(var, set()).add((block, pos, instr))
         return uses
 
     def conflict_on_phis(self):
@@ -70,7 +69,7 @@ class LivenessSSA:
         with one-another"""
         for b in self._function.get_blocks():
             phis = [i for i in b.get_instructions() if isinstance(i, PhiNode)]
-            previous_vars = set()
+            previous_vars = TempSet()
             for phi in phis:
                 previous_vars.update(phi.defined())
                 self._liveout[phi].update(previous_vars)
@@ -6,18 +6,23 @@ CAP, SSA Intro, Elimination and Optimisations
 Classes for a SSA operations.
 """
 
-from typing import List, Dict, Set, Any
+from typing import List, Dict, Set, Any, Optional, Tuple
 from graphviz import Digraph
 from TP05.CFG import (Block, CFG)
 from TP04.Operands import (
-    Temporary, DataLocation,
+    Temporary, TempSet, DataLocation,
     Renamer)
 from TP04.Instruction3A import (Instruction, Instru3A, Label)
+from TP05.Dominance import (computeIdom, DominatorTree)
+from TP05.LivenessDataFlow import LivenessDataFlow
+from TP05.SmartAllocation import sequentialize_moves
 
 
 class PhiNode(Instruction):
     """ A phi node is a renaming """
 
+    __slots__ = ('_var', '_srcs')
+
     def __init__(self, var, srcs):
         super().__init__()
         self._var: DataLocation = var
@@ -66,19 +71,18 @@ def computeDom(function: CFG) -> Dict[Block, Set[Block]]:
             dominators[b] = all_blocks
         else:
             dominators[b] = {b}
-    new_dominators: Dict[Block, Set[Block]] = dict()
-    while True:
-        for b in all_blocks:
+    # Update in place, in reverse postorder: predecessors are visited
+    # first (except along back edges), so few rounds are needed.
+    changed = True
+    while changed:
+        changed = False
+        for b in function.reverse_postorder():
             if b._in:
                 dom_preds = [dominators[b2] for b2 in b._in]
-                new_dominators[b] = {b}.union(set.intersection(*dom_preds))
-            else:
-                new_dominators[b] = {b}
-        if dominators == new_dominators:
-            break
-        else:
-            dominators = new_dominators
-            new_dominators = dict()
+                new_doms = {b}.union(set.intersection(*dom_preds))
+                if new_doms != dominators[b]:
+                    dominators[b] = new_doms
+                    changed = True
     return dominators
 
 
@@ -112,7 +116,7 @@ def computeDT(function: CFG, dominators) -> Dict[Block, Set[Block]]:
 
 def computeDF_at_node(
         function: CFG,
-        dominators: Dict[Block, Set[Block]],
+        dominators: DominatorTree,
         DT: Dict[Block, Set[Block]],
         b: Block,
         DF: Dict[Block, Set[Block]]) -> None:
@@ -120,13 +124,15 @@ def computeDF_at_node(
     `computeDF_at_node(...)` computes the dominance frontier at the given
     node.
     Complete the dictionnary `DF` which associates a node to its frontier.
+    `dominators.strictly_dominates(a, b)` tells in constant time whether
+    `a` is in `dominators[b] - {b}`.
     """
     S: Set[Block] = set()
     S = {b_succ for b_succ in b._out if b_succ not in DT[b]}
     for b_succ in DT[b]:
         computeDF_at_node(function, dominators, DT, b_succ, DF)
         for b_frontier in DF[b_succ]:
-            if b not in (dominators[b_frontier] - {b_frontier}):
+            if not dominators.strictly_dominates(b, b_frontier):
                 S.add(b_frontier)
     DF[b] = S
 
@@ -142,26 +148,91 @@ def computeDF(function: CFG, dominators, DT) -> Dict[Block, Set[Block]]:
     return DF
 
 
-def insertPhis(function: CFG, DF):
+# SSA construction modes, see insertPhis
+MINIMAL = 'minimal'
+SEMI_PRUNED = 'semi-pruned'
+PRUNED = 'pruned'
+SSA_MODES = [MINIMAL, SEMI_PRUNED, PRUNED]
+
+
+def phi_candidates(function: CFG, mode=MINIMAL):
+    """The variables that may need phi nodes in function with mode, each
+    with the blocks defining it and, with mode PRUNED, the blocks where it
+    is live at the beginning (None otherwise)."""
+    non_local = None  # Variables used before being defined in a block
+    live_in = None  # Variable -> blocks where it is live at the beginning
+    if mode == SEMI_PRUNED:
+        non_local = TempSet()
+        for b in function.get_blocks():
+            b.set_gen_kill()
+            non_local |= b._gen
+    elif mode == PRUNED:
+        liveness = LivenessDataFlow(function)
+        liveness.run(instructions=False)
+        live_in = dict()
+        for b in function.get_blocks():
+            for var in liveness.get_live_in(b):
+                live_in.setdefault(var, set()).add(b)
+    for var, defs in function.gather_defs().items():
+        if non_local is not None and var not in non_local:
+            continue
+        live = None if live_in is None else live_in.get(var, set())
+        yield var, defs, live
+
+
+def add_phi(var: Temporary, b: Block):
+    """Add a phi node for var at the beginning of b."""
+    srcs = {pred_b._label: var for pred_b in b._in}
+    b.add_instruction(0, PhiNode(var, srcs))
+
+
+def insertPhis(function: CFG, DF, mode=MINIMAL):
     """
-    'insertPhis(CFG, DF)' inserts phi nodes in 'CFG' where needed.
+    'insertPhis(CFG, DF, mode)' inserts phi nodes in 'CFG' where needed.
+    With mode SEMI_PRUNED, only for the variables used in some block before
+    being defined in it (the others never cross a block boundary); with
+    PRUNED, only in the blocks where the variable is live.
     """
-    for var, defs in function.gather_defs().items():
+    for var, defs, live in phi_candidates(function, mode):
         has_phi: Set[Block] = set()
         queue: List[Block] = list(defs)
         while queue:
             d = queue.pop(0)
             for b in DF[d]:
-                if b not in has_phi:
+                if b not in has_phi and (live is None or b in live):
+                    add_phi(var, b)
                     has_phi.add(b)
-                    srcs = {pred_b._label: var for pred_b in b._in}
-                    phi = PhiNode(var, srcs)
-                    b.add_instruction(0, phi)
-                    queue.append(b)
+                    if b not in defs:
+                        queue.append(b)
+
+
+def insertPhisIDF(function: CFG, dominators: DominatorTree, mode=MINIMAL):
+    """
+    Same as insertPhis, without the dominance frontiers: the blocks of
+    each variable are given by the iterated frontier query of dominators.
+    """
+    for var, defs, live in phi_candidates(function, mode):
+        for b in dominators.iterated_frontier(defs, live):
+            add_phi(var, b)
+
+
+def count_phis(function: CFG) -> int:
+    """Number of phi nodes in function."""
+    return sum(isinstance(i, PhiNode)
+               for b in function.get_blocks() for i in b.get_instructions())
+
+
+def count_moves(function: CFG) -> int:
+    """Number of moves between temporaries in function (e.g. the moves
+    left by the SSA exit)."""
+    return sum(isinstance(i, Instru3A) and i.get_name() == "mv"
+               and all(isinstance(arg, Temporary) for arg in i.args)
+               for b in function.get_blocks() for i in b.get_instructions())
 
 
-def rename_node(function: CFG, DT, renamer: Renamer, b: Block):
-    renamer = renamer.copy()
+def rename_node(function: CFG, renamer: Renamer, b: Block):
+    """Rename the temporaries of b, and the arguments coming from b of the
+    phi nodes of its successors."""
     for i in b.get_instructions():
         if isinstance(i, (Instru3A, PhiNode)):
             i.rename(renamer)
@@ -169,13 +240,27 @@ def rename_node(function: CFG, DT, renamer: Renamer, b: Block):
         for i in b_succ.get_instructions():
             if isinstance(i, PhiNode):
                 i.rename_from(renamer, b._label)
-    for b_succ in DT[b]:
-        rename_node(function, DT, renamer, b_succ)
 
 
 def rename_variables(function: CFG, DT):
-    for b in function.get_entries():
-        rename_node(function, DT, Renamer(function._pool), b)
+    """Rename the temporaries in a walk of the domination tree from the
+    entries: the names given in a block are seen by its subtree only, and
+    are undone when leaving it. The walk uses an explicit stack, to
+    support deep domination trees, and visits the children of a block by
+    id, for the names to be the same at each run."""
+    renamer = Renamer(function._pool)
+    for b_entry in function.get_entries():
+        # (block, None) to enter a block, (block, mark) to leave it
+        stack: List[Tuple[Block, Optional[int]]] = [(b_entry, None)]
+        while stack:
+            b, mark = stack.pop()
+            if mark is not None:
+                renamer.undo(mark)
+                continue
+            stack.append((b, renamer.mark()))
+            rename_node(function, renamer, b)
+            stack.extend((b_succ, None) for b_succ in
+                         sorted(DT[b], key=Block.get_id, reverse=True))
 
 
 def print_ssa_graph(basename, fname, comment, graph):  # pragma: no cover
@@ -188,68 +273,104 @@ def print_ssa_graph(basename, fname, comment, graph):  # pragma: no cover
     dot.render(f"{basename}.{fname}.ssa.{comment}.dot", view=True)
 
 
-def enter_ssa(function: CFG, basename="prog", debug=False, debug_graphs=False):
-    # Compute the dominators
-    dominators = computeDom(function)
+def enter_ssa(function: CFG, basename="prog", debug=False, debug_graphs=False,
+              mode=MINIMAL):
+    # Compute the immediate dominators; the dominators and the
+    # domination tree are derived from them
+    idom = computeIdom(function)
+    dominators = DominatorTree(function, idom)
     if debug:
         print("SSA - dominators:", dominators)
 
     # Compute the domination tree
-    DT = computeDT(function, dominators)
+    DT = dominators.get_DT()
     if debug:
         print("SSA - domination tree:", DT)
     if debug_graphs:
         print_ssa_graph(basename, function._name, "DT", DT)
 
-    # Compute the dominance frontier
-    DF = computeDF(function, dominators, DT)
-    if debug:
-        print("SSA - dominance frontier:", DF)
+    # Compute the dominance frontier, only to print it: insertPhisIDF
+    # computes the iterated frontiers it needs directly
+    DF = None
+    if debug or debug_graphs:
+        DF = dominators.frontiers()
+        if debug:
+            print("SSA - dominance frontier:", DF)
 
     # Insert phi nodes
-    insertPhis(function, DF)
+    insertPhisIDF(function, dominators, mode)
+    if debug:
+        print("SSA - phi nodes ({}): {}".format(mode, count_phis(function)))
 
     # Rename variables
     rename_variables(function, DT)
     return DF
 
 
-def generate_moves_from_phis(phis: List[PhiNode], parent: Block) -> List[Instruction]:
+def generate_moves_from_phis(phis: List[PhiNode], parent: Block,
+                             function: CFG) -> List[Instruction]:
     """
-    'generate_moves_from_phis(phis, parent)' builds a list of move instructions
-    to be inserted in a new block between 'parent' and the block with phi nodes
+    'generate_moves_from_phis(phis, parent, function)' builds a list of move
+    instructions to be inserted between 'parent' and the block with phi nodes
     'phis'. This is an helper function called during SSA exit.
+    The phis are a parallel copy: the moves are sequentialized (see
+    sequentialize_moves), with a new temporary of 'function' to break the
+    cycles, if any.
     """
-    moves: List[Instruction] = []
     lbl = parent._label
-    parallel_moves = set()
+    # A list, for the order of the moves to be the same at each run
+    parallel_moves = []
     for phi in phis:
         dest = phi.defined()[0]
         src = phi._srcs[lbl]
-        if src:
-            i = Instru3A("mv", dest, src)
-            moves.append(i)
-    return moves
+        if src and src is not dest:
+            parallel_moves.append((dest, src))
+    # There can be a cycle only if a destination is also a source
+    srcs = {src for _, src in parallel_moves}
+    tmp = None
+    if any(dest in srcs for dest, _ in parallel_moves):
+        tmp = function.new_tmp()
+    return [Instru3A("mv", dest, src)
+            for dest, src in sequentialize_moves(tmp, parallel_moves)]
 
 
 def exit_ssa(function: CFG):
     """
     'exit_ssa(function)' replaces phi nodes with move instructions
     to exit SSA form.
+    The moves of an edge parent -> b go at the end of parent, before its
+    jump, if b is its only successor; at the beginning of b if parent is its
+    only predecessor; and otherwise, for a critical edge, in a new block
+    between parent and b.
     """
     for b in function.get_blocks():
         phis: List[PhiNode] = [i for i in b.get_instructions() if isinstance(i, PhiNode)]
+        if not phis:
+            continue
+        b._listIns = [i for i in b.get_instructions() if not isinstance(i, PhiNode)]
         parents: List[Block] = [p for p in b._in]
-        if phis:
-            for parent in parents:
-                moves = generate_moves_from_phis(phis, parent)
+        for parent in parents:
+            moves = generate_moves_from_phis(phis, parent, function)
+            if not moves:
+                continue
+            jump = parent.get_jump()
+            if len(parent._out) == 1 and (jump is None or not jump.is_cond_jump()):
+                instrs = parent._listIns
+                pos = len(instrs)
+                if jump is not None:
+                    while instrs[pos - 1] is not jump:
+                        pos -= 1
+                    pos -= 1
+                instrs[pos:pos] = moves
+            elif len(b._in) == 1:
+                b._listIns[0:0] = moves
+            else:
                 new_b = Block(function.new_label("mv"), moves)
                 function.add_block(new_b)
                 function.remove_edge(parent, b)
                 function.add_edge(parent, new_b)
                 function.add_edge(new_b, b)
-                jump = parent.get_jump()
-                if jump:
+                # When b is the fallthrough of a conditional jump, the
+                # linearization adds the jump to new_b
+                if jump is not None and jump.label() is b._label:
                     jump.set_label(new_b._label)
-            for phi in phis:
-                b._listIns.remove(phi)
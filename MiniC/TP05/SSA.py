@@ -6,18 +6,22 @@ CAP, SSA Intro, Elimination and Optimisations
 Classes for a SSA operations.
 """
 
-from typing import List, Dict, Set, Any
+from typing import List, Dict, Set, Any, Optional, Tuple
 from graphviz import Digraph
 from TP05.CFG import (Block, CFG)
 from TP04.Operands import (
-    Temporary, DataLocation,
+    Temporary, TempSet, DataLocation,
     Renamer)
 from TP04.Instruction3A import (Instruction, Instru3A, Label)
+from TP05.Dominance import (computeIdom, idom_to_DT)
+from TP05.LivenessDataFlow import LivenessDataFlow
 
 
 class PhiNode(Instruction):
     """ A phi node is a renaming """
 
+    __slots__ = ('_var', '_srcs')
+
     def __init__(self, var, srcs):
         super().__init__()
         self._var: DataLocation = var
@@ -68,7 +72,8 @@ def computeDom(function: CFG) -> Dict[Block, Set[Block]]:
             dominators[b] = {b}
     new_dominators: Dict[Block, Set[Block]] = dict()
     while True:
-        for b in all_blocks:
+        # Reverse postorder: predecessors first, except along back edges
+        for b in function.reverse_postorder():
             pass # TODO compute new_dominators
         if dominators == new_dominators:
             break
@@ -133,22 +138,65 @@ def computeDF(function: CFG, dominators, DT) -> Dict[Block, Set[Block]]:
     return DF
 
 
-def insertPhis(function: CFG, DF):
+# SSA construction modes, see insertPhis
+MINIMAL = 'minimal'
+SEMI_PRUNED = 'semi-pruned'
+PRUNED = 'pruned'
+SSA_MODES = [MINIMAL, SEMI_PRUNED, PRUNED]
+
+
+def insertPhis(function: CFG, DF, mode=MINIMAL):
     """
-    'insertPhis(CFG, DF)' inserts phi nodes in 'CFG' where needed.
+    'insertPhis(CFG, DF, mode)' inserts phi nodes in 'CFG' where needed.
+    With mode SEMI_PRUNED, only for the variables used in some block before
+    being defined in it (the others never cross a block boundary); with
+    PRUNED, only in the blocks where the variable is live.
     """
+    non_local = None  # Variables used before being defined in a block
+    live_in = None  # Variable -> blocks where it is live at the beginning
+    if mode == SEMI_PRUNED:
+        non_local = TempSet()
+        for b in function.get_blocks():
+            b.set_gen_kill()
+            non_local |= b._gen
+    elif mode == PRUNED:
+        liveness = LivenessDataFlow(function)
+        liveness.run(instructions=False)
+        live_in = dict()
+        for b in function.get_blocks():
+            for var in liveness.get_live_in(b):
+                live_in.setdefault(var, set()).add(b)
     for var, defs in function.gather_defs().items():
+        if non_local is not None and var not in non_local:
+            continue
+        # Blocks where var is live at the beginning, None unless PRUNED
+        live = None if live_in is None else live_in.get(var, set())
         has_phi: Set[Block] = set()
         queue: List[Block] = list(defs)
         while queue:
             d = queue.pop(0)
             for b in DF[d]:
                 if b not in has_phi:
-                    pass # TODO add a phi node to 'b'
+                    pass # TODO add a phi node to 'b' (if 'b' is in 'live', when PRUNED)
+
+
+def count_phis(function: CFG) -> int:
+    """Number of phi nodes in function."""
+    return sum(isinstance(i, PhiNode)
+               for b in function.get_blocks() for i in b.get_instructions())
 
 
-def rename_node(function: CFG, DT, renamer: Renamer, b: Block):
-    renamer = renamer.copy()
+def count_moves(function: CFG) -> int:
+    """Number of moves between temporaries in function (e.g. the moves
+    left by the SSA exit)."""
+    return sum(isinstance(i, Instru3A) and i.get_name() == "mv"
+               and all(isinstance(arg, Temporary) for arg in i.args)
+               for b in function.get_blocks() for i in b.get_instructions())
+
+
+def rename_node(function: CFG, renamer: Renamer, b: Block):
+    """Rename the temporaries of b, and the arguments coming from b of the
+    phi nodes of its successors."""
     for i in b.get_instructions():
         if isinstance(i, (Instru3A, PhiNode)):
             i.rename(renamer)
@@ -156,13 +204,27 @@ def rename_node(function: CFG, DT, renamer: Renamer, b: Block):
         for i in b_succ.get_instructions():
             if isinstance(i, PhiNode):
                 i.rename_from(renamer, b._label)
-    for b_succ in DT[b]:
-        rename_node(function, DT, renamer, b_succ)
 
 
 def rename_variables(function: CFG, DT):
-    for b in function.get_entries():
-        rename_node(function, DT, Renamer(function._pool), b)
+    """Rename the temporaries in a walk of the domination tree from the
+    entries: the names given in a block are seen by its subtree only, and
+    are undone when leaving it. The walk uses an explicit stack, to
+    support deep domination trees, and visits the children of a block by
+    id, for the names to be the same at each run."""
+    renamer = Renamer(function._pool)
+    for b_entry in function.get_entries():
+        # (block, None) to enter a block, (block, mark) to leave it
+        stack: List[Tuple[Block, Optional[int]]] = [(b_entry, None)]
+        while stack:
+            b, mark = stack.pop()
+            if mark is not None:
+                renamer.undo(mark)
+                continue
+            stack.append((b, renamer.mark()))
+            rename_node(function, renamer, b)
+            stack.extend((b_succ, None) for b_succ in
+                         sorted(DT[b], key=Block.get_id, reverse=True))
 
 
 def print_ssa_graph(basename, fname, comment, graph):  # pragma: no cover
@@ -175,19 +237,26 @@ def print_ssa_graph(basename, fname, comment, graph):  # pragma: no cover
     dot.render(f"{basename}.{fname}.ssa.{comment}.dot", view=True)
 
 
-def enter_ssa(function: CFG, basename="prog", debug=False, debug_graphs=False):
+def enter_ssa(function: CFG, basename="prog", debug=False, debug_graphs=False,
+              mode=MINIMAL):
     dominators = computeDom(function)
     if debug:
         print("SSA - dominators:", dominators)
     DT = computeDT(function, dominators)
     if debug:
         print("SSA - domination tree:", DT)
+        # Check against the tree given by the immediate dominators
+        idom_DT = idom_to_DT(function, computeIdom(function))
+        if DT != idom_DT:
+            print("SSA - domination tree differs from computeIdom:", idom_DT)
     if debug_graphs:
         print_ssa_graph(basename, function._name, "DT", DT)
     DF = computeDF(function, dominators, DT)
     if debug:
         print("SSA - dominance frontier:", DF)
-    insertPhis(function, DF)
+    insertPhis(function, DF, mode)
+    if debug:
+        print("SSA - phi nodes ({}): {}".format(mode, count_phis(function)))
     rename_variables(function, DT)
     return DF
 
@@ -0,0 +1,296 @@
+"""
+CAP, SSA Intro
+SSA construction during the 3-address code generation, as in Braun,
+Buchwald, Hack, Leißa, Mallon, Zwinkau, "Simple and Efficient Construction
+of Static Single Assignment Form": the phi nodes are created when a
+temporary is read in a block where it is not defined, so that neither the
+dominators nor a renaming pass are needed (compare with enter_ssa).
+Used by MiniCCodeGen3AVisitor with MiniCC.py --ssa-mode on-the-fly.
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+from Errors import MiniCInternalError
+from TP04.APIRiscV import LinearCode
+from TP04.Instruction3A import (Instruction, Instru3A, Label)
+from TP04.Operands import Operand, Temporary
+from TP05.SSA import PhiNode
+
+
+class SSALinearCode(LinearCode):
+    """Linear code in SSA form, built as the instructions are added.
+
+    The code is cut into blocks as the CFG will cut it, at labels and
+    after jumps, and every block starts with a label (one is added after a
+    jump when needed), so that the phi nodes can refer to the labels of
+    their predecessors.
+
+    Each temporary of the code generation is a variable: its first
+    definition keeps its name and the next ones define fresh temporaries.
+    A use is replaced by the current value of the variable in the block
+    (local value numbering) or, if it is not defined there, by its value
+    in the predecessors (global value numbering): through a phi node when
+    there are several of them.
+
+    A block is sealed when all its predecessors are known: when its label
+    is added, or for the labels added with sealed=False (loop heads), by
+    seal_label. The phis of a block not sealed yet get their arguments
+    when it is sealed. A phi whose arguments are all the same value (or
+    the phi itself) is trivial: it is removed and replaced by this value,
+    which may make the phis using it trivial in turn. This gives pruned
+    SSA, minimal on the reducible CFGs of MiniC.
+
+    A jump to a label already sealed (a loop head added without
+    sealed=False) reopens the function: the next instructions are only
+    recorded, and finish_ssa builds the SSA form again from the original
+    instructions, each label being sealed after the last jump to it.
+
+    finish_ssa() must be called at the end of the function: it inserts the
+    remaining phis after the labels of their blocks.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        # Instructions renamed, with their original arguments
+        self._renamed: List[Tuple[Instru3A, List[Operand]]] = []
+        # Temporaries created for the SSA form, in order, and the ones of
+        # the first construction left to reuse when it is done again
+        self._created: List[Temporary] = []
+        self._free: List[Temporary] = []
+        self._reopened = False
+        self._finished = False
+        self._reset()
+
+    def _reset(self):
+        self._block: Optional[Label] = None  # Current block, None after a jump
+        # Block falling through to the next label, when _block is None
+        self._fallthrough: Optional[Label] = None
+        self._preds: Dict[Label, List[Label]] = dict()
+        self._sealed: Set[Label] = set()
+        # Value of each variable at the end of the blocks (so far for the
+        # current block)
+        self._current_def: Dict[Temporary, Dict[Label, Temporary]] = dict()
+        self._phis: Dict[Label, List[PhiNode]] = dict()
+        self._phi_block: Dict[Temporary, Label] = dict()
+        # Phis of blocks not sealed yet, with their variable
+        self._incomplete: Dict[Label, List[Tuple[Temporary, PhiNode]]] = dict()
+        # Phis of sealed blocks waiting for their arguments
+        self._pending: List[Tuple[Temporary, PhiNode, Label]] = []
+        # Phis using the value of each phi, to check them again when it is
+        # removed
+        self._users: Dict[Temporary, List[PhiNode]] = dict()
+        # Value replacing each removed phi
+        self._replaced: Dict[Temporary, Temporary] = dict()
+
+    def add_label(self, s, sealed=True):
+        if self._reopened:
+            self._listIns.append(s)
+            return s
+        pred = self._block if self._block is not None else self._fallthrough
+        if pred is not None:
+            self._add_pred(s, pred)
+        self._listIns.append(s)
+        self._block = s
+        self._fallthrough = None
+        if sealed:
+            self.seal_label(s)
+        return s
+
+    def seal_label(self, s):
+        if self._reopened:
+            return
+        self._sealed.add(s)
+        for var, phi in self._incomplete.pop(s, []):
+            self._pending.append((var, phi, s))
+        self._complete_phis()
+
+    def add_instruction(self, i, link_with_succ=True):
+        if isinstance(i, Label):
+            return self.add_label(i)
+        if self._finished:
+            raise MiniCInternalError(
+                "Instruction {} added after finish_ssa".format(i))
+        if self._reopened:
+            self._listIns.append(i)
+            return i
+        if self._block is None:
+            self.add_label(self.new_label(self._name))
+        if isinstance(i, Instru3A):
+            self._rename(i)
+            if i.is_jump():
+                self._add_pred(i.label(), self._block)
+                self._fallthrough = self._block if i.is_cond_jump() else None
+                self._block = None
+        self._listIns.append(i)
+        return i
+
+    def finish_ssa(self):
+        """Seal the blocks left, and insert the phi nodes in the code,
+        each operand being replaced by its final value."""
+        if self._reopened:
+            self._rebuild()
+        for i in self._listIns:
+            if isinstance(i, Label) and i not in self._sealed:
+                self.seal_label(i)
+        code: List[Instruction] = []
+        for i in self._listIns:
+            if isinstance(i, Instru3A) and self._replaced:
+                i.args = [self._value(arg) if isinstance(arg, Temporary)
+                          else arg for arg in i.args]
+            code.append(i)
+            if isinstance(i, Label):
+                for phi in self._phis.get(i, []):
+                    phi._srcs = {p: self._value(v) for p, v in phi._srcs.items()}
+                    code.append(phi)
+        self._listIns = code
+        self._finished = True
+
+    def _rebuild(self):
+        """Build the SSA form again from the original instructions, now
+        that all the jumps are known: each label is sealed when it is
+        added, or after the last jump to it if it comes later."""
+        code = self._listIns
+        for i, args in self._renamed:
+            i.args = args
+        self._renamed = []
+        self._free = self._created[::-1]
+        self._created = []
+        self._reopened = False
+        self._reset()
+        self._listIns = []
+        last_jump: Dict[Label, int] = dict()
+        for n, i in enumerate(code):
+            if isinstance(i, Instru3A) and i.is_jump():
+                last_jump[i.label()] = n
+        seal_after: Dict[int, List[Label]] = dict()
+        for n, i in enumerate(code):
+            if isinstance(i, Label) and last_jump.get(i, -1) > n:
+                seal_after.setdefault(last_jump[i], []).append(i)
+        for n, i in enumerate(code):
+            if isinstance(i, Label):
+                self.add_label(i, sealed=last_jump.get(i, -1) < n)
+            else:
+                self.add_instruction(i)
+            for label in seal_after.get(n, []):
+                self.seal_label(label)
+
+    def _new_tmp(self) -> Temporary:
+        """A temporary for the SSA form, reused from the first
+        construction if the form is built again."""
+        t = self._free.pop() if self._free else self.new_tmp()
+        self._created.append(t)
+        return t
+
+    def _add_pred(self, s: Label, pred: Label):
+        if s in self._sealed:
+            # Its phis may be missing: the form is built again at the end
+            self._reopened = True
+            return
+        preds = self._preds.setdefault(s, [])
+        if pred not in preds:
+            preds.append(pred)
+
+    def _rename(self, i: Instru3A):
+        """Replace the uses of i by their current values, then give a new
+        value to the temporary defined by i."""
+        args = list(i.args)
+        self._renamed.append((i, list(args)))
+        read_only = i.is_read_only()
+        for n, arg in enumerate(args):
+            if isinstance(arg, Temporary) and (n > 0 or read_only):
+                args[n] = self._read(arg, self._block)  # type: ignore
+        if not read_only and args and isinstance(args[0], Temporary):
+            var = args[0]
+            if var in self._current_def:
+                args[0] = self._new_tmp()
+            self._current_def.setdefault(var, dict())[self._block] = args[0]  # type: ignore
+        i.args = args
+
+    def _read(self, var: Temporary, block: Label) -> Temporary:
+        """The value of var at the end of block."""
+        value = self._lookup(var, block)
+        self._complete_phis()
+        return self._value(value)
+
+    def _lookup(self, var: Temporary, block: Label) -> Temporary:
+        """The value of var at the end of block, going up the chains of
+        blocks with a single predecessor (without recursion), and creating
+        a phi at the first join or block not sealed. The arguments of a
+        phi in a sealed block are left for _complete_phis."""
+        defs = self._current_def.setdefault(var, dict())
+        path = []
+        b = block
+        value = defs.get(b)
+        while value is None:
+            preds = self._preds.get(b, [])
+            if b in self._sealed and len(preds) == 1:
+                path.append(b)
+                b = preds[0]
+                value = defs.get(b)
+            else:
+                value = self._new_phi(var, b)
+        for b in path:
+            defs[b] = value
+        return value
+
+    def _new_phi(self, var: Temporary, b: Label) -> Temporary:
+        phi = PhiNode(self._new_tmp(), dict())
+        value = phi._var
+        # Before the arguments are looked up, for the loops to stop here
+        self._current_def[var][b] = value
+        self._phis.setdefault(b, []).append(phi)
+        self._phi_block[value] = b
+        if b in self._sealed:
+            self._pending.append((var, phi, b))
+        else:
+            self._incomplete.setdefault(b, []).append((var, phi))
+        return value
+
+    def _complete_phis(self):
+        """Look up the arguments of the pending phis, then remove them if
+        trivial. Looking up an argument may create pending phis in turn:
+        a worklist replaces the recursion of the paper."""
+        while self._pending:
+            var, phi, b = self._pending.pop()
+            for pred in self._preds.get(b, []):
+                value = self._value(self._lookup(var, pred))
+                phi._srcs[pred] = value
+                if value in self._phi_block:
+                    self._users.setdefault(value, []).append(phi)
+            self._remove_trivial_phi(phi)
+
+    def _remove_trivial_phi(self, phi: PhiNode):
+        worklist = [phi]
+        while worklist:
+            phi = worklist.pop()
+            value = phi._var
+            if value in self._replaced:
+                continue
+            same = None
+            for v in phi._srcs.values():
+                v = self._value(v)
+                if v is value or v is same:
+                    continue
+                if same is not None:
+                    break  # Not trivial
+                same = v
+            else:
+                if same is None:
+                    # No argument but itself: unreachable block, kept as is
+                    continue
+                self._replaced[value] = same
+                self._phis[self._phi_block.pop(value)].remove(phi)
+                # Its users now use same
+                users = self._users.pop(value, [])
+                if same in self._phi_block:
+                    self._users.setdefault(same, []).extend(users)
+                worklist.extend(user for user in users if user is not phi)
+
+    def _value(self, v: Temporary) -> Temporary:
+        """v, or the value replacing it if it was a removed phi."""
+        replaced = self._replaced
+        root = v
+        while root in replaced:
+            root = replaced[root]
+        while v in replaced and replaced[v] is not root:
+            replaced[v], v = root, replaced[v]
+        return root
@@ -0,0 +1,366 @@
+"""
+CAP, SSA Elimination
+Out-of-SSA translation with coalescing, an alternative to exit_ssa (see
+MiniCC.py --ssa-coalescing), after Sreedhar et al., "Translating Out of
+Static Single Assignment Form", and Boissinot et al., "Revisiting
+Out-of-SSA Translation for Correctness, Code Quality, and Efficiency":
+
+1. Each phi a0 = φ(a1, ..., an) is isolated: a copy ai' = ai is added at
+   the end of each predecessor, and a0 = a0' at the beginning of the
+   block, a0' = φ(a1', ..., an') being the new phi. The copies of a same
+   point are a parallel copy. The variables of the new phi, a
+   φ-congruence class, can share a name since they do not interfere.
+2. Each copy is coalesced, by merging the classes of its two variables,
+   when no two variables of the classes interfere. Two variables interfere
+   when their live ranges intersect (the one defined first, in the
+   dominance order, is live after the definition of the other), and they
+   do not hold the same value (through copies). Only the variables whose
+   definitions dominate each other can intersect: the classes are kept
+   sorted in the order of the domination tree, with the nearest dominator
+   of each variable in its class (the dominance forest of Budimlić et
+   al.). The variables of the smaller class are checked against their
+   dominators in the other class, and against the variables they dominate
+   in it, found by bisection; then inserted in it.
+3. The variables of each class are renamed to a single name, the phis are
+   removed, and the copies left are sequentialized.
+
+No edge is split: the copies at the end of a predecessor only define
+variables local to the edge, unless coalesced, which the interference
+test prevents if they are live on another edge.
+"""
+
+from bisect import bisect_left
+from typing import Dict, List, Optional, Set, Tuple
+from TP04.Operands import Temporary, Immediate, Operand
+from TP04.Instruction3A import (Instruction, Instru3A, Opcode)
+from TP05.CFG import (Block, CFG)
+from TP05.Dominance import (computeIdom, DominatorTree)
+from TP05.SmartAllocation import sequentialize_moves
+from TP05.SSA import PhiNode
+
+
+# A parallel copy: (destination, source) pairs, and the mv instructions
+# placed for them in the code (sequentialized after the renaming)
+ParallelCopy = Tuple[List[Tuple[Temporary, Operand]], List[Instru3A]]
+
+
+def exit_ssa_coalescing(function: CFG, debug=False):
+    """
+    'exit_ssa_coalescing(function)' replaces phi nodes with move
+    instructions to exit SSA form, like exit_ssa, but only where the
+    variables of a phi interfere.
+    """
+    OutOfSSA(function, debug).run()
+
+
+class OutOfSSA:
+    """See the module documentation."""
+
+    def __init__(self, function: CFG, debug=False):
+        self._function = function
+        self._debug = debug
+        self._copies: List[ParallelCopy] = []
+        # Union-find of the congruence classes, with their members and
+        # the keys of the members, sorted by key
+        self._parent: Dict[Temporary, Temporary] = dict()
+        self._members: Dict[Temporary, List[Temporary]] = dict()
+        self._keys: Dict[Temporary, List[Tuple[int, int, int]]] = dict()
+        # Nearest dominator of each temporary in its class, if any
+        self._up: Dict[Temporary, Temporary] = dict()
+        # Position of the definition of each temporary: block, index in
+        # the block (-1 for the phis)
+        self._def: Dict[Temporary, Tuple[Block, int]] = dict()
+        # Key of the definitions in the order of the domination tree
+        # (entry time of the block, index, id), and exit time of the
+        # block: the definition of a dominates the one of b iff
+        # key[a] <= key[b] < (exit[a],)
+        self._key: Dict[Temporary, Tuple[int, int, int]] = dict()
+        self._exit: Dict[Temporary, int] = dict()
+        self._value: Dict[Temporary, Temporary] = dict()
+        # Last use of a temporary in a block
+        self._last_use: Dict[Tuple[Temporary, Block], int] = dict()
+        self._live_out: Dict[Block, Set[Temporary]] = dict()
+
+    def run(self):
+        phi_blocks = [b for b in self._function.get_blocks()
+                      if any(isinstance(i, PhiNode) for i in b.get_instructions())]
+        if not phi_blocks:
+            return
+        for b in phi_blocks:
+            self.isolate_phis(b)
+        self.analyze()
+        for pairs, _ in self._copies:
+            for dest, src in pairs:
+                if isinstance(src, Temporary):
+                    self.coalesce(dest, src)
+        if self._debug:
+            classes = [c for c in self._members.values() if len(c) > 1]
+            print("SSA - congruence classes:", classes)
+        self.rename()
+
+    def isolate_phis(self, b: Block):
+        """Step 1, for the phis of b."""
+        phis = [i for i in b.get_instructions() if isinstance(i, PhiNode)]
+        for pred in dict.fromkeys(b._in):
+            pairs: List[Tuple[Temporary, Operand]] = []
+            for phi in phis:
+                src = phi._srcs[pred._label]
+                if src:
+                    new = self._function.new_tmp()
+                    pairs.append((new, src))
+                    phi._srcs[pred._label] = new
+            self.add_copy(pred, pairs, at_end=True)
+        pairs = []
+        for phi in phis:
+            new = self._function.new_tmp()
+            pairs.append((phi._var, new))
+            phi._var = new
+        self.add_copy(b, pairs, at_end=False)
+        for phi in phis:
+            members = [phi._var] + [src for src in phi._srcs.values()
+                                    if isinstance(src, Temporary)]
+            for t in members:
+                self._parent[t] = phi._var
+            self._members[phi._var] = members
+
+    def add_copy(self, b: Block, pairs: List[Tuple[Temporary, Operand]],
+                 at_end: bool):
+        """Add the parallel copy pairs at the end of b (before its jump), or
+        after its phis."""
+        if not pairs:
+            return
+        moves = [Instru3A("li" if isinstance(src, Immediate) else "mv",
+                          dest, src) for dest, src in pairs]
+        instrs = b._listIns
+        if at_end:
+            pos = len(instrs)
+            jump = b.get_jump()
+            if jump is not None:
+                while instrs[pos - 1] is not jump:
+                    pos -= 1
+                pos -= 1
+        else:
+            pos = 0
+            while pos < len(instrs) and isinstance(instrs[pos], PhiNode):
+                pos += 1
+        instrs[pos:pos] = moves
+        self._copies.append((pairs, moves))
+
+    def analyze(self):
+        """Compute the definitions, values, last uses in each block and
+        the liveness at the end of each block, for the interference test."""
+        function = self._function
+        dominators = DominatorTree(function, computeIdom(function))
+        enter, exit = dominators._enter, dominators._exit
+        # Uses live at the beginning of a block, and uses in the phis, at
+        # the end of the predecessors
+        live_in_uses: List[Tuple[Temporary, Block]] = []
+        live_out_uses: List[Tuple[Temporary, Block]] = []
+        # Blocks in the order of the domination tree: the definitions of
+        # the sources of the copies are seen before them
+        for b in sorted(function.get_blocks(), key=enter.__getitem__):
+            for n, i in enumerate(b.get_instructions()):
+                if isinstance(i, PhiNode):
+                    for label, src in i._srcs.items():
+                        if isinstance(src, Temporary):
+                            live_out_uses.append((src, function.get_block(label)))
+                    self.define(i._var, b, -1, i._var, enter[b], exit[b])
+                    continue
+                if not i.is_instruction():
+                    continue
+                for t in i.used():
+                    if isinstance(t, Temporary):
+                        if ((t, b) not in self._last_use
+                                and self._def.get(t, (None, 0))[0] is not b):
+                            live_in_uses.append((t, b))
+                        self._last_use[(t, b)] = n
+                for t in i.defined():
+                    if isinstance(t, Temporary):
+                        value = t
+                        if (isinstance(i, Instru3A) and i.get_opcode() == Opcode.MV
+                                and isinstance(i.args[1], Temporary)):
+                            value = self._value.get(i.args[1], i.args[1])
+                        self.define(t, b, n, value, enter[b], exit[b])
+        # Liveness by exploring the paths from the uses back to the
+        # definition, as in LivenessSSA: each block only stores the
+        # variables live at its end
+        self._live_out = {b: set() for b in function.get_blocks()}
+        for t, b in live_in_uses:
+            for pred in b._in:
+                self.mark_live_out(t, pred)
+        for t, pred in live_out_uses:
+            self.mark_live_out(t, pred)
+        for root, members in self._members.items():
+            members.sort(key=self._key.__getitem__)
+            self._keys[root] = [self._key[t] for t in members]
+            # Nearest dominators, with a stack of the dominators
+            stack: List[Temporary] = []
+            for t in members:
+                while stack and not self.dominates(stack[-1], t):
+                    stack.pop()
+                if stack:
+                    self._up[t] = stack[-1]
+                stack.append(t)
+
+    def define(self, t: Temporary, b: Block, n: int, value: Temporary,
+               enter: int, exit: int):
+        self._def[t] = (b, n)
+        self._key[t] = (enter, n, t.get_id())
+        self._exit[t] = exit
+        self._value[t] = value
+
+    def mark_live_out(self, t: Temporary, b: Block):
+        """t is live at the end of b, and so at the end of the blocks
+        before it, up to its definition."""
+        def_block = self._def.get(t, (None, 0))[0]
+        stack = [b]
+        while stack:
+            b = stack.pop()
+            live = self._live_out[b]
+            if t not in live:
+                live.add(t)
+                if b is not def_block:
+                    stack.extend(b._in)
+
+    def dominates(self, a: Temporary, b: Temporary) -> bool:
+        """True if the definition of a dominates the one of b (or is
+        before it, for the phis of a same block)."""
+        return self._key[a] <= self._key[b] < (self._exit[a],)
+
+    def live_after_def(self, a: Temporary, b: Temporary) -> bool:
+        """True if a is live just after the definition of b (whose
+        definition is dominated by the one of a)."""
+        block, n = self._def[b]
+        if a in self._live_out[block]:
+            return True
+        return self._last_use.get((a, block), -1) > n
+
+    def intersect(self, a: Temporary, b: Temporary) -> bool:
+        """True if the live ranges of a and b intersect, the definition
+        of a dominating the one of b."""
+        if self.live_after_def(a, b):
+            return True
+        # Defined at the same point (phis of a same block)
+        return self._def[a] == self._def[b] and self.live_after_def(b, a)
+
+    def interfere_above(self, a: Temporary, x: Temporary) -> bool:
+        """Interference of x with a, its nearest dominator in a class, or
+        with the dominators of a in the class. A dominator d of a live
+        after the definition of x is also live after the one of a: as d
+        and a do not interfere, they hold the same value. So only the
+        dominators with the value of a are checked."""
+        value = self._value[a]
+        if self._value[x] is value:
+            return False
+        d: Optional[Temporary] = a
+        while d is not None and self._value[d] is value:
+            if self.intersect(d, x):
+                return True
+            d = self._up.get(d)
+        return False
+
+    def find(self, t: Temporary) -> Temporary:
+        """The representative of the class of t."""
+        root = t
+        while self._parent.get(root, root) is not root:
+            root = self._parent[root]
+        while t is not root:
+            self._parent[t], t = root, self._parent[t]
+        return root
+
+    def coalesce(self, a: Temporary, b: Temporary) -> bool:
+        """Merge the classes of a and b if they do not interfere. The
+        variables of the smaller class are checked against their
+        dominators and the variables they dominate in the larger one."""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a is root_b:
+            return True
+        if a not in self._def or b not in self._def:
+            return False  # Undefined source
+        small = self._members.get(root_a, [root_a])
+        large = self._members.setdefault(root_b, [root_b])
+        if len(small) > len(large):
+            root_a, root_b = root_b, root_a
+            small = self._members.get(root_a, [root_a])
+            large = self._members.setdefault(root_b, [root_b])
+        keys = self._keys.setdefault(root_b, [self._key[root_b]])
+        key, exit, up = self._key, self._exit, self._up
+        # Nearest dominators in the merged class, set if no interference
+        new_up: List[Tuple[Temporary, Temporary]] = []
+        for x in small:
+            pos = bisect_left(keys, key[x])
+            # The nearest dominator of x in large is the one before it in
+            # the order of the domination tree, or one of its dominators
+            d = large[pos - 1] if pos else None
+            while d is not None and not self.dominates(d, x):
+                d = up.get(d)
+            if d is not None:
+                if self.interfere_above(d, x):
+                    return False
+                if x not in up or key[up[x]] < key[d]:
+                    new_up.append((x, d))
+            # The variables of large dominated by x. If x is not live
+            # after the definition of y, it is not after the ones that y
+            # dominates either: they are skipped.
+            end = bisect_left(keys, (exit[x],), pos)
+            while pos < end:
+                y = large[pos]
+                if y not in up or key[up[y]] < key[x]:
+                    new_up.append((y, x))
+                if self.intersect(x, y):
+                    if self._value[x] is not self._value[y]:
+                        return False
+                    pos += 1
+                else:
+                    pos = bisect_left(keys, (exit[y],), pos + 1, end)
+        for x, d in new_up:
+            up[x] = d
+        for x in small:
+            pos = bisect_left(keys, key[x])
+            keys.insert(pos, key[x])
+            large.insert(pos, x)
+        self._parent[root_a] = root_b
+        self._members.pop(root_a, None)
+        self._keys.pop(root_a, None)
+        return True
+
+    def rename(self):
+        """Step 3."""
+        function = self._function
+        name: Dict[Temporary, Temporary] = dict()
+        for root, members in self._members.items():
+            for t in members:
+                name[t] = root
+        sequences: Dict[Instruction, List[Instruction]] = dict()
+        skipped: Set[Instruction] = set()
+        for pairs, moves in self._copies:
+            # In the order of pairs (without duplicates), for the order of
+            # the moves to be the same at each run
+            renamed = dict.fromkeys((name.get(dest, dest), name.get(src, src))
+                                    for dest, src in pairs)
+            parallel_moves = [(dest, src) for dest, src in renamed
+                              if dest is not src]
+            srcs = {src for _, src in parallel_moves}
+            tmp: Optional[Temporary] = None
+            if any(dest in srcs for dest, _ in parallel_moves):
+                tmp = function.new_tmp()
+            sequences[moves[0]] = [
+                Instru3A("li" if isinstance(src, Immediate) else "mv",
+                         dest, src)
+                for dest, src in sequentialize_moves(tmp, parallel_moves)]
+            skipped.update(moves[1:])
+        for b in function.get_blocks():
+            instrs: List[Instruction] = []
+            for i in b.get_instructions():
+                if isinstance(i, PhiNode) or i in skipped:
+                    continue
+                if i in sequences:
+                    instrs.extend(sequences[i])
+                    continue
+                if isinstance(i, Instru3A) and any(
+                        isinstance(arg, Temporary) and arg in name
+                        for arg in i.args):
+                    i.args = [name.get(arg, arg) if isinstance(arg, Temporary)
+                              else arg for arg in i.args]
+                instrs.append(i)
+            b._listIns = instrs
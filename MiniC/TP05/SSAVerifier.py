@@ -0,0 +1,79 @@
+"""
+CAP, SSA Intro
+Check of the SSA invariants, after enter_ssa and after each pass on the
+SSA form (see MiniCC.py --verify-ssa):
+- each temporary is defined once;
+- the phi nodes are at the beginning of their block, and have one operand
+  per predecessor label;
+- the definition of each temporary dominates its uses: the uses in a phi
+  are at the end of the corresponding predecessor.
+Linear in the size of the code, once the domination tree is computed:
+the dominance queries take constant time (see DominatorTree.dominates).
+"""
+
+from typing import Dict, Tuple
+from Errors import MiniCInternalError
+from TP04.Instruction3A import Instruction
+from TP04.Operands import Temporary
+from TP05.CFG import (Block, CFG)
+from TP05.Dominance import (computeIdom, DominatorTree)
+from TP05.SSA import PhiNode
+
+
+def verify_ssa(function: CFG, after: str):
+    """
+    'verify_ssa(function, after)' raises MiniCInternalError if function
+    breaks an invariant of the SSA form, after the pass named after.
+    """
+    def error(msg: str, b: Block, i: Instruction):
+        raise MiniCInternalError("Invalid SSA form after {}: {} (in {} of {})"
+                                 .format(after, msg, i, b.get_label()))
+
+    dominators = DominatorTree(function, computeIdom(function))
+    # Definitions: block, index in the block (-1 for the phis)
+    defs: Dict[Temporary, Tuple[Block, int]] = dict()
+    for b in function.get_blocks():
+        preds = {pred.get_label() for pred in b._in}
+        in_phis = True
+        for n, i in enumerate(b.get_instructions()):
+            if isinstance(i, PhiNode):
+                if not in_phis:
+                    error("phi node after an instruction", b, i)
+                if set(i._srcs) != preds:
+                    error("operands from {} for the predecessors {}".format(
+                        sorted(map(str, i._srcs)), sorted(map(str, preds))),
+                          b, i)
+                n = -1
+            elif i.is_instruction():
+                in_phis = False
+            for t in i.defined():
+                if isinstance(t, Temporary):
+                    if t in defs:
+                        error("{} already defined in {}".format(
+                            t, defs[t][0].get_label()), b, i)
+                    defs[t] = (b, n)
+
+    def check_use(t, b: Block, n: int, i: Instruction, user: Block):
+        """The definition of t is before the index n of b. t is None for
+        the phi operands of undefined variables (minimal SSA)."""
+        if not isinstance(t, Temporary):
+            return
+        if t not in defs:
+            error("{} is not defined".format(t), user, i)
+        def_b, def_n = defs[t]
+        if def_b is b:
+            if def_n >= n:
+                error("{} used before its definition".format(t), user, i)
+        elif not dominators.dominates(def_b, b):
+            error("{} defined in {}, which does not dominate {}".format(
+                t, def_b.get_label(), b.get_label()), user, i)
+
+    for b in function.get_blocks():
+        for n, i in enumerate(b.get_instructions()):
+            if isinstance(i, PhiNode):
+                for label, src in i._srcs.items():
+                    pred = function.get_block(label)
+                    check_use(src, pred, len(pred.get_instructions()), i, b)
+            elif i.is_instruction():
+                for t in i.used():
+                    check_use(t, b, n, i, b)
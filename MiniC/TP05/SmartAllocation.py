@@ -1,4 +1,4 @@
-from typing import List, Tuple, Set, Any
+from typing import Iterable, List, Tuple, Any
 from TP04.Operands import Operand, Temporary, S, Register, GP_REGS, FP
 from TP04.Instruction3A import Instru3A
 from TP04.SimpleAllocations import Allocator
@@ -114,19 +114,20 @@ def generate_smart_move(dest: Operand, src: Operand) -> List[Instru3A]:
 
 
 def sequentialize_moves(tmp: Register,
-                        parallel_moves: Set[Tuple[Any, Any]]) -> List[Tuple[Any, Any]]:
-    """Take a set of parallel moves represented as (destination, source) pairs,
+                        parallel_moves: Iterable[Tuple[Any, Any]]) -> List[Tuple[Any, Any]]:
+    """Take parallel moves represented as (destination, source) pairs,
     and return a list of sequential moves which respect the cycles.
     Use the specified tmp for cycles.
-    Returns a list of (destination, source) pairs"""
+    Returns a list of (destination, source) pairs, in an order that only
+    depends on the order of parallel_moves"""
     move_graph = DiGraph()
     for dest, src in parallel_moves:
         move_graph.add_edge((src, dest))
     moves = []
     # First iteratively remove all the edges without successors.
-    vars_without_successor = {src
+    vars_without_successor = [src
                               for src, dests in move_graph.neighbourhoods()
-                              if len(dests) == 0}
+                              if len(dests) == 0]
     while vars_without_successor:
         var = vars_without_successor.pop()
         for src, dests in move_graph.neighbourhoods():
@@ -134,7 +135,7 @@ def sequentialize_moves(tmp: Register,
                 moves.append((var, src))
                 dests.remove(var)
                 if len(dests) == 0:
-                    vars_without_successor.add(src)
+                    vars_without_successor.append(src)
         move_graph.delete_vertex(var)
     # Then handle the cycles.
     cycles = move_graph.connex_components()
@@ -0,0 +1,19 @@
+#include "printlib.h"
+
+int main() {
+
+    int x, i;
+    x = 7;
+    i = 0;
+    while (i < 2) {
+        x = x;
+        i = i + 1;
+    }
+    x = x;
+    println_int(x);
+
+    return 0;
+}
+
+// EXPECTED
+// 7
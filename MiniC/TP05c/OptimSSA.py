@@ -8,7 +8,7 @@ Optimisations on SSA.
 
 from enum import Enum
 from Errors import MiniCInternalError
-from typing import List, Dict, Optional, Union, Tuple, cast
+from typing import List, Dict, Optional, Set, Union, Tuple, cast
 from TP05.CFG import (Block, CFG)
 from TP04.Operands import (Operand, Temporary, Immediate, A, ZERO)
 from TP04.Instruction3A import (Instruction, Instru3A, Label, CondJump)
@@ -89,9 +89,12 @@ class CondConstantPropagation:
         self._function = function
         self.valueness = dict()
         self.executability = dict()
+        # Blocks with an executable incoming edge
+        self._executable_blocks: Set[Block] = set()
 
         self._all_vars = function.gather_defs().keys()
-        self._all_blocks: List[Block] = function.get_blocks()
+        # Reverse postorder, for a faster fixpoint in compute()
+        self._all_blocks: List[Block] = list(function.reverse_postorder())
 
         # Initialisation of valueness and executability
         for var in self._all_vars:
@@ -134,12 +137,15 @@ class CondConstantPropagation:
         if not old_x:
             self._modified_flag = True
             self.executability[B, C] = True
+            self._executable_blocks.add(C)
 
     def is_constant(self, op: Operand) -> bool:
         return isinstance(self.valueness.get(op, None), int)
 
     def is_executable(self, B: Block) -> bool:
-        return B in (C for ((_, C), b) in self.executability.items() if b)
+        """True if an edge to B is executable. Only the edges marked by
+        set_executability are seen."""
+        return B in self._executable_blocks
 
     def compute(self, debug: bool) -> None:
         """
@@ -166,7 +172,7 @@ class CondConstantPropagation:
                 self.dump()
 
             # 3. For any executable block B with only one successor C,
-            # set executability[B, C] = True
+            # call self.set_executability(B, C)
             for B in self._all_blocks:
                 if self.is_executable(B) and len(B._out) == 1:
                     C = B._out[0]
@@ -192,8 +198,9 @@ class CondConstantPropagation:
         # set valueness[v] = join(x1, .., xn)
 
         # 6. TODO For any executable conditional branch to blocks B1 and B2,
-        # set executability[B1] = True and/or executability[B2] = True
-        # depending on the valueness of its condition
+        # call self.set_executability(B, B1) and/or
+        # self.set_executability(B, B2) depending on the valueness of its
+        # condition (not executability[B, C] = True, see is_executable)
 
     def get_executable_srcs(self, B: Block, phi: PhiNode) -> List[Operand]:
         """
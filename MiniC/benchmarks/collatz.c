@@ -0,0 +1,26 @@
+#include "printlib.h"
+
+int main() {
+    int n, x, steps, total;
+    n = 1;
+    total = 0;
+    while (n <= 200) {
+        x = n;
+        steps = 0;
+        while (x != 1) {
+            if (x % 2 == 0) {
+                x = x / 2;
+            } else {
+                x = 3 * x + 1;
+            }
+            steps = steps + 1;
+        }
+        total = total + steps;
+        n = n + 1;
+    }
+    println_int(total);
+    return 0;
+}
+
+// EXPECTED
+// 8418
@@ -0,0 +1,25 @@
+#include "printlib.h"
+
+int main() {
+    int n, a, b, t;
+    n = 0;
+    a = 0;
+    b = 1;
+    while (n < 1000) {
+        t = (a + b) % 1000007;
+        a = b;
+        b = t;
+        if (n % 200 == 0) {
+            println_int(a);
+        }
+        n = n + 1;
+    }
+    return 0;
+}
+
+// EXPECTED
+// 1
+// 938387
+// 483145
+// 414788
+// 79375
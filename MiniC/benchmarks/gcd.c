@@ -0,0 +1,27 @@
+#include "printlib.h"
+
+int main() {
+    int i, j, a, b, t, s;
+    s = 0;
+    i = 1;
+    while (i <= 30) {
+        j = 1;
+        while (j <= 30) {
+            a = i;
+            b = j;
+            while (b != 0) {
+                t = a % b;
+                a = b;
+                b = t;
+            }
+            s = s + a;
+            j = j + 1;
+        }
+        i = i + 1;
+    }
+    println_int(s);
+    return 0;
+}
+
+// EXPECTED
+// 2205
@@ -0,0 +1,27 @@
+#include "printlib.h"
+
+int main() {
+    int i, a, b, c, d, e, f, g, h, k, l, m;
+    i = 0;
+    a = 1; b = 2; c = 3; d = 4; e = 5; f = 6;
+    g = 7; h = 8; k = 9; l = 10; m = 11;
+    while (i < 300) {
+        a = (b + c) % 97;
+        b = (c + d) % 89;
+        c = (d + e) % 83;
+        d = (e + f) % 79;
+        e = (f + g) % 73;
+        f = (g + h) % 71;
+        g = (h + k) % 67;
+        h = (k + l) % 61;
+        k = (l + m) % 59;
+        l = (m + a) % 53;
+        m = (a + b + c + d + e + f + g + h + k + l) % 101;
+        i = i + 1;
+    }
+    println_int(a + b + c + d + e + f + g + h + k + l + m);
+    return 0;
+}
+
+// EXPECTED
+// 367
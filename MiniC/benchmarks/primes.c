@@ -0,0 +1,27 @@
+#include "printlib.h"
+
+int main() {
+    int n, d, count;
+    bool prime;
+    n = 2;
+    count = 0;
+    while (n < 600) {
+        prime = true;
+        d = 2;
+        while (prime && d * d <= n) {
+            if (n % d == 0) {
+                prime = false;
+            }
+            d = d + 1;
+        }
+        if (prime) {
+            count = count + 1;
+        }
+        n = n + 1;
+    }
+    println_int(count);
+    return 0;
+}
+
+// EXPECTED
+// 109
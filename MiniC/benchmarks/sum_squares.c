@@ -0,0 +1,16 @@
+#include "printlib.h"
+
+int main() {
+    int i, s;
+    i = 0;
+    s = 0;
+    while (i < 2000) {
+        s = s + i * i % 1000;
+        i = i + 1;
+    }
+    println_int(s);
+    return 0;
+}
+
+// EXPECTED
+// 923000
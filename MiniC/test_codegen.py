@@ -5,11 +5,15 @@ import sys
 import pytest
 import glob
 import subprocess
+import shutil
 import re
 from test_expect_pragma import (
     TestExpectPragmas, cat, testinfo,
     env_bool_variable, env_str_variable
     )
+from Errors import MiniCRuntimeError
+from OutputChannel import OutputChannel
+from RiscVSimulator import simulate
 
 """
 Usage:
@@ -46,6 +50,11 @@ ALLOC_FILES = glob.glob(os.path.join(HERE, 'TP05/tests/**/*.c'), recursive=True)
 ASM = 'riscv64-unknown-elf-gcc'
 SIMU = 'spike'
 
+# Without the cross toolchain (or with USE_SIMULATOR=1 in the environment),
+# run the generated code with the in-process simulator RiscVSimulator.py.
+USE_SIMULATOR = shutil.which(ASM) is None or shutil.which(SIMU) is None
+env_bool_variable('USE_SIMULATOR', globals())
+
 SKIP_NOT_IMPLEMENTED = False
 if 'SKIP_NOT_IMPLEMENTED' in os.environ:
     SKIP_NOT_IMPLEMENTED = True
@@ -108,6 +117,8 @@ class TestCodeGen(TestExpectPragmas):
         return self.compile_and_simulate(file, info, reg_alloc='gcc', use_gcc=True)
 
     def compile_with_gcc(self, file, output_name):
+        if USE_SIMULATOR:
+            pytest.skip("GCC is not used with the simulator")
         print("Compiling with GCC...")
         result = self.run_command(
             [ASM, '-S', '-I./',
@@ -127,7 +138,7 @@ class TestCodeGen(TestExpectPragmas):
         cmd = [sys.executable, MINIC_COMPILE,
                alloc_opt, out_opt]
         if ENABLE_SSA:
-            cmd += ['--ssa']
+            cmd += ['--ssa', '--verify-ssa']
         if SSA_OPTIMS:
             cmd += ['--ssa-optim']
         if DISABLE_TYPECHECK:
@@ -161,7 +172,26 @@ class TestCodeGen(TestExpectPragmas):
         print("Compiling ... OK")
         return result
 
+    def simulate(self, output_name, info):
+        if any(not f.endswith('.s') for f in info.linkargs):
+            pytest.skip("Linking C code needs the RiscV toolchain")
+        files = [output_name] + info.linkargs
+        print("Simulating " + ' '.join(files))
+        output = OutputChannel.capture()
+        try:
+            execcode, _ = simulate(files, output)
+        except MiniCRuntimeError as e:
+            pytest.fail("Simulation failed: {}. Infinite loop in generated code?"
+                        .format(e))
+        return testinfo(execcode=execcode,
+                        exitcode=0,
+                        output=output.getvalue(),
+                        linkargs=[],
+                        skip_test_expected=False)
+
     def link_and_run(self, output_name, exec_name, info):
+        if USE_SIMULATOR:
+            return self.simulate(output_name, info)
         self.remove(exec_name)
         cmd = [
             ASM, output_name, 'TP04/libprint.s',
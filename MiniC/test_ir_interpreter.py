@@ -0,0 +1,199 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import glob
+import pytest
+from antlr4 import FileStream, CommonTokenStream
+from test_expect_pragma import (
+    TestExpectPragmas, cat, testinfo, env_bool_variable
+    )
+from MiniCLexer import MiniCLexer
+from MiniCParser import MiniCParser
+from Errors import MiniCInternalError, MiniCUnsupportedError
+from OutputChannel import OutputChannel
+from TP03.MiniCTypingVisitor import MiniCTypingVisitor, MiniCTypeError
+from TP04.APIRiscV import LinearCode
+from TP04.Instruction3A import Instru3A
+from TP04.MiniCCodeGen3AVisitor import MiniCCodeGen3AVisitor
+from TP04.Operands import Condition
+from TP05.CFG import CFG
+from TP05.Dominance import computeIdom, CHK, SEMI_NCA
+from TP05.SSA import PhiNode, enter_ssa, exit_ssa
+from TP05.SSACoalescing import exit_ssa_coalescing
+from TP05.SSAVerifier import verify_ssa
+from TP05.IRInterpreter import IRInterpreter
+from TP05c.OptimSSA import OptimSSA
+
+"""
+Usage:
+    python3 test_ir_interpreter.py
+(or make tests-ir)
+"""
+
+"""
+CAP, 2021
+Run the 3-address code directly with TP05/IRInterpreter.py, after each
+middle-end pass, and compare the output to the expected one.
+Neither the RiscV toolchain nor spike is needed.
+"""
+
+ENABLE_SSA = False
+SSA_OPTIMS = False
+env_bool_variable('ENABLE_SSA', globals())
+env_bool_variable('SSA_OPTIMS', globals())
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+if HERE == os.path.realpath('.'):
+    HERE = '.'
+TEST_DIR = HERE
+
+ALL_FILES = glob.glob(os.path.join(TEST_DIR, 'TP04/tests/**/[a-zA-Z]*.c'), recursive=True)
+ALL_FILES += glob.glob(os.path.join(TEST_DIR, 'TP05/tests/**/*.c'), recursive=True)
+ALL_FILES += glob.glob(os.path.join(TEST_DIR, 'TP05c/tests/**/*.c'), recursive=True)
+
+if 'TEST_FILES' in os.environ:
+    ALL_FILES = glob.glob(os.environ['TEST_FILES'], recursive=True)
+
+ALL_FILES = sorted(set(ALL_FILES))
+
+STAGES = ['linear', 'cfg']
+if ENABLE_SSA:
+    STAGES += ['ssa', 'exit_ssa', 'exit_ssa_coalescing', 'ssa_on_the_fly',
+               'exit_ssa_on_the_fly']
+if SSA_OPTIMS:
+    STAGES += ['ssa_optim']
+
+
+def compile_3a(filename, ssa=False):
+    """Front-end and 3-address code generation (directly in SSA form
+    with ssa), in-process.
+    Return (exitcode, message, functions) like MiniCC.py would."""
+    lexer = MiniCLexer(FileStream(filename, encoding='utf-8'))
+    parser = MiniCParser(CommonTokenStream(lexer))
+    tree = parser.prog()
+    if parser.getNumberOfSyntaxErrors() > 0:
+        return 3, "", []
+    try:
+        MiniCTypingVisitor().visit(tree)
+    except MiniCTypeError as e:
+        return 2, e.args[0] + os.linesep, []
+    visitor3 = MiniCCodeGen3AVisitor(False, parser, ssa=ssa)
+    try:
+        visitor3.visit(tree)
+    except MiniCUnsupportedError as e:
+        return 5, str(e) + os.linesep, []
+    return 0, "", visitor3.get_functions()
+
+
+def run_stage(function, stage):
+    """Apply the passes up to stage, then interpret the code."""
+    code = function
+    if stage != 'linear':
+        code = CFG(function)
+    if stage in ('ssa', 'exit_ssa', 'exit_ssa_coalescing', 'ssa_optim'):
+        enter_ssa(code)
+        verify_ssa(code, 'enter_ssa')
+    elif stage.endswith('on_the_fly'):
+        verify_ssa(code, 'SSA code generation')
+    if stage == 'ssa_optim':
+        OptimSSA(code, debug=False)
+        verify_ssa(code, 'OptimSSA')
+    if stage in ('exit_ssa', 'exit_ssa_on_the_fly'):
+        exit_ssa(code)
+    if stage == 'exit_ssa_coalescing':
+        exit_ssa_coalescing(code)
+    output = OutputChannel.capture()
+    exitcode = IRInterpreter(code, output).run()
+    return testinfo(exitcode=0, execcode=exitcode, output=output.getvalue(),
+                    linkargs=[], skip_test_expected=False)
+
+
+# Ways to break the SSA form of ssa_diamond, that verify_ssa must detect
+SSA_FAULTS = ['double_definition', 'phi_after_instruction',
+              'phi_operand_labels', 'use_not_dominated']
+
+
+def ssa_diamond(fault=None):
+    """A CFG in SSA form: x = φ(x1, x2) after an if, then printed; or
+    with the SSA fault fault."""
+    f = LinearCode('main')
+    then_label, else_label, end_label = (
+        f.new_label(name) for name in ('then', 'else', 'end'))
+    c, x1, x2, x = (f.new_tmp() for _ in range(4))
+    f.add_instruction_LI(c, 1)
+    f.add_instruction_cond_JUMP(else_label, c, Condition('beq'), 0)
+    f.add_label(then_label)
+    f.add_instruction_LI(x1, 1)
+    f.add_instruction_JUMP(end_label)
+    f.add_label(else_label)
+    f.add_instruction_LI(x2, 2)
+    f.add_label(end_label)
+    f.add_instruction_PRINTLN_INT(x)
+    cfg = CFG(f)
+    entry = cfg.get_entries()[0]
+    end = cfg.get_block(end_label)
+    phi = PhiNode(x, {then_label: x1, else_label: x2})
+    end.add_instruction(0, phi)
+    if fault == 'double_definition':
+        cfg.get_block(then_label).add_instruction(0, Instru3A("li", x2, 3))
+    elif fault == 'phi_after_instruction':
+        end.add_instruction(0, Instru3A("li", cfg.new_tmp(), 0))
+    elif fault == 'phi_operand_labels':
+        phi._srcs = {then_label: x1, entry.get_label(): x2}
+    elif fault == 'use_not_dominated':
+        end.add_instruction(1, Instru3A("mv", cfg.new_tmp(), x1))
+    return cfg
+
+
+class TestIRInterpreter(TestExpectPragmas):
+    # Not in test_expect_pragma to get assertion rewritting
+    def assert_equal(self, actual, expected):
+        if expected.output is not None and actual.output is not None:
+            assert actual.output == expected.output, \
+                "Output of the program is incorrect."
+        assert actual.exitcode == expected.exitcode, \
+            "Exit code of the compiler is incorrect"
+        assert actual.execcode == expected.execcode, \
+            "Exit code of the execution is incorrect"
+
+    @pytest.mark.parametrize('stage', STAGES)
+    @pytest.mark.parametrize('filename', ALL_FILES)
+    def test_ir(self, filename, stage):
+        cat(filename)  # For diagnosis
+        expect = self.get_expect(filename)
+        if expect.linkargs:
+            pytest.skip("Test needs external code")
+        exitcode, message, functions = compile_3a(
+            filename, ssa=stage.endswith('on_the_fly'))
+        if exitcode != 0:
+            actual = testinfo(exitcode=exitcode, execcode=0, output=message,
+                              linkargs=[], skip_test_expected=False)
+            if self.skip_if_partial_match(actual, expect, True):
+                return
+            self.assert_equal(actual, expect)
+            return
+        main = [f for f in functions if f._name == "main"]
+        assert len(main) == 1
+        self.assert_equal(run_stage(main[0], stage), expect)
+
+    @pytest.mark.parametrize('fault', SSA_FAULTS)
+    def test_verify_ssa(self, fault):
+        verify_ssa(ssa_diamond(), 'ssa_diamond')
+        with pytest.raises(MiniCInternalError):
+            verify_ssa(ssa_diamond(fault), fault)
+
+    @pytest.mark.parametrize('filename', ALL_FILES)
+    def test_dominators(self, filename):
+        # SEMI_NCA is only picked by computeIdom from SEMI_NCA_THRESHOLD
+        # blocks, more than in the tests: compare it with CHK on each CFG
+        exitcode, _, functions = compile_3a(filename)
+        if exitcode != 0:
+            pytest.skip("Test expecting a compilation failure")
+        for function in functions:
+            cfg = CFG(function)
+            assert computeIdom(cfg, SEMI_NCA) == computeIdom(cfg, CHK)
+
+
+if __name__ == '__main__':
+    pytest.main(sys.argv)
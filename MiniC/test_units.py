@@ -0,0 +1,279 @@
+#! /usr/bin/env python3
+
+import io
+import os
+import sys
+import pytest
+from antlr4 import InputStream, CommonTokenStream
+from MiniCLexer import MiniCLexer
+from MiniCParser import MiniCParser
+from Errors import MiniCInternalError, MiniCRuntimeError
+from OutputChannel import OutputChannel
+from RiscVSimulator import simulate
+from TP03.MiniCInterpretVisitor import MiniCInterpretVisitor
+from TP04.APIRiscV import LinearCode
+from TP04.Instruction3A import Instru3A
+from TP04.Operands import (
+    Condition, Immediate, Offset, TemporaryPool, TempSet, A0, FP)
+from TP04.PackedInstructions import PackedInstructions
+from TP05.CFG import CFG
+from TP05.LivenessDataFlow import LivenessDataFlow
+from TP05.SSA import PhiNode
+
+"""
+Usage:
+    python3 test_units.py
+(or make tests-units)
+"""
+
+"""
+CAP, 2021
+Unit tests of the infrastructure of the compiler: no MiniC program is
+compiled nor run with the RiscV toolchain.
+"""
+
+
+def sample_code():
+    """Linear code with each kind of instruction of the code generation:
+    labels, comments, arithmetic, memory accesses, calls and jumps."""
+    f = LinearCode('main')
+    loop, end = f.new_label('loop'), f.new_label('end')
+    a, b, c = f.new_tmp(), f.new_tmp(), f.new_tmp()
+    f.add_comment("Sample code")
+    f.add_instruction_LI(a, 10)
+    f.add_instruction_LI(b, 1 << 70)  # Too large for the integer arrays
+    f.add_label(loop)
+    f.add_instruction_cond_JUMP(end, a, Condition('ble'), 0)
+    f.add_instruction_SUB(a, a, c)
+    f.add_instruction_ADD(c, a, Immediate(-1))
+    f.add_instruction_SD(c, Offset(FP, -8))
+    f.add_instruction_LD(b, Offset(FP, -8))
+    f.add_instruction_PRINTLN_INT(b)
+    f.add_instruction_JUMP(loop)
+    f.add_label(end)
+    f.add_instruction_MV(A0, c)
+    return f
+
+
+def assert_same_instructions(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        if isinstance(e, Instru3A):
+            assert type(a) is type(e)
+            assert a._ins == e._ins
+            assert a.args == e.args
+        else:
+            assert a is e  # Labels, comments and phis are kept as they are
+
+
+class TestPackedInstructions:
+
+    def test_round_trip(self):
+        f = sample_code()
+        code = f.get_instructions()
+        a = code[1].args[0]
+        code = code + [PhiNode(f.new_tmp(), {code[3]: a})]
+        packed = PackedInstructions(code)
+        assert len(packed) == len(code)
+        assert_same_instructions(packed.to_list(), code)
+        assert [str(i) for i in packed.to_list()] == [str(i) for i in code]
+
+    def test_block_pack(self):
+        cfg = CFG(sample_code())
+        for b in cfg.get_blocks():
+            expected = [str(i) for i in b.get_instructions()]
+            b.pack(cfg._pool)
+            assert b.is_packed()
+            assert [str(i) for i in b.get_instructions()] == expected
+            assert not b.is_packed()
+
+    def test_gen_kill(self):
+        cfg = CFG(sample_code())
+        for b in cfg.get_blocks():
+            b.set_gen_kill()
+            expected = (b._gen.bits(), b._kill.bits())
+            b.pack(cfg._pool)
+            b.set_gen_kill()
+            assert b.is_packed()  # Computed on the arrays
+            assert (b._gen.bits(), b._kill.bits()) == expected
+
+    def test_liveout_bits(self):
+        cfg = CFG(sample_code())
+        liveness = LivenessDataFlow(cfg)
+        liveness.run()
+        for b in cfg.get_blocks():
+            code = b.get_instructions()
+            packed = PackedInstructions(code, cfg._pool)
+            assert packed.liveout_bits(liveness._out[b].bits()) == \
+                [liveness._liveout[i].bits() for i in code]
+
+
+class TestTempSet:
+
+    @pytest.fixture
+    def temps(self):
+        pool = TemporaryPool()
+        return [pool.new_tmp() for _ in range(70)]
+
+    def test_set_methods(self, temps):
+        s = TempSet(temps[:3])
+        s.add(temps[65])
+        s.discard(temps[1])
+        s.discard(temps[2])
+        s.discard(temps[2])
+        s.discard(None)
+        assert list(s) == [temps[0], temps[65]]
+        assert len(s) == 2 and s
+        assert temps[65] in s and temps[1] not in s and None not in s
+        s.update([temps[4]])
+        s.update(TempSet([temps[5]]))
+        assert set(s) == {temps[0], temps[4], temps[5], temps[65]}
+        s.remove(temps[4])
+        with pytest.raises(KeyError):
+            s.remove(temps[4])
+        c = s.copy()
+        s.clear()
+        assert not s and len(c) == 3
+
+    def test_operators(self, temps):
+        a, b = TempSet(temps[:4]), TempSet(temps[2:6])
+        sa, sb = set(temps[:4]), set(temps[2:6])
+        for x, y in [(a, b), (a, sb), (sa, b)]:
+            assert x | y == sa | sb
+            assert x & y == sa & sb
+            assert x - y == sa - sb
+            assert x ^ y == sa ^ sb
+            assert not x <= y and not x >= y
+            assert x & y <= x and x | y >= y
+            assert not x.isdisjoint(y)
+        assert isinstance(a | sb, TempSet) and isinstance(sa | b, TempSet)
+        # Not only temporaries: the result is a set
+        assert a | {"x"} == set(temps[:4]) | {"x"}
+
+    def test_equality(self, temps):
+        assert TempSet() == set() and set() == TempSet()
+        assert TempSet(temps[:2]) == {temps[0], temps[1]}
+        assert {temps[0], temps[1]} == TempSet(temps[:2])
+        assert TempSet(temps[:2]) != {temps[0]}
+        assert TempSet(temps[:2]) != {temps[0], temps[2]}
+        assert TempSet(temps[:2]) == TempSet(temps[1::-1])
+        assert TempSet(temps[:2]) != [temps[0], temps[1]]
+
+    def test_in_place(self, temps):
+        s = TempSet(temps[:2])
+        s |= {temps[2]}
+        s |= TempSet([temps[66]])
+        assert s == set(temps[:3]) | {temps[66]}
+        s -= {temps[0]}
+        s -= TempSet([temps[1]])
+        assert s == {temps[2], temps[66]}
+        s &= {temps[66], temps[3]}
+        assert s == {temps[66]}
+        s &= TempSet()
+        assert s == set()
+
+
+SAMPLE_ASM = """
+        .text
+        .globl main
+main:
+        addi sp, sp, -16
+        sd ra, 8(sp)
+        li t0, 5
+        li t1, 0
+loop:   beqz t0, end
+        add t1, t1, t0
+        addi t0, t0, -1
+        j loop
+end:
+        mv a0, t1
+        call println_int  # Builtins of libprint.s
+        li a0, 65
+        call println_char
+        la a0, msg
+        call println_string
+        ld ra, 8(sp)
+        addi sp, sp, 16
+        li a0, 3
+        ret
+msg:
+        .string "hello"
+"""
+
+
+class TestRiscVSimulator:
+
+    def simulate_text(self, tmp_path, text):
+        filename = os.path.join(tmp_path, 'prog.s')
+        with open(filename, 'w') as f:
+            f.write(text)
+        output = OutputChannel.capture()
+        code, sim = simulate([filename], output)
+        return code, output.getvalue(), sim
+
+    def test_simulate(self, tmp_path):
+        code, output, sim = self.simulate_text(tmp_path, SAMPLE_ASM)
+        assert (code, output) == (3, "15\nA\nhello\n")
+        assert sim.loads_stores() == (1, 1)
+        assert sim.counts['beqz'] == 6 and sim.counts['j'] == 5
+
+    def test_exit(self, tmp_path):
+        code, output, _ = self.simulate_text(
+            tmp_path, "main:\n li a0, 42\n call println_int\n"
+            " li a0, 2\n call exit\n li a0, 0\n ret\n")
+        assert (code, output) == (2, "42\n")
+
+    def test_unknown_function(self, tmp_path):
+        with pytest.raises(MiniCInternalError):
+            self.simulate_text(tmp_path, "main:\n call printf\n ret\n")
+
+    def test_libprint_not_simulated(self):
+        # The builtins are emulated, libprint.s itself is not supported
+        libprint = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                'TP04', 'libprint.s')
+        with pytest.raises(MiniCInternalError):
+            simulate([libprint], OutputChannel.capture())
+
+
+class TestOutputChannel:
+
+    def test_chunks(self):
+        stream = io.StringIO()
+        output = OutputChannel(stream, bufsize=3)
+        output.println("a")
+        output.write("b")
+        assert stream.getvalue() == ""
+        output.write("c")  # Third chunk: the buffer is written
+        assert stream.getvalue() == "a\nbc"
+        output.println("d")
+        assert stream.getvalue() == "a\nbc"
+        output.flush()
+        output.flush()
+        assert stream.getvalue() == "a\nbcd\n"
+
+    def test_capture(self):
+        output = OutputChannel.capture()
+        for i in range(10000):  # More than one buffer
+            output.println(str(i))
+        expected = ''.join('{}\n'.format(i) for i in range(10000))
+        assert output.getvalue() == expected
+        output.write("x")
+        assert output.getvalue() == expected + "x"
+
+    def test_getvalue_needs_capture(self):
+        with pytest.raises(AssertionError):
+            OutputChannel(io.StringIO()).getvalue()
+
+    def test_interpreter_flush(self):
+        # Flushed by the interpreter itself, also before a runtime error
+        text = "int main(){ println_int(42); println_int(1/0); return 0; }"
+        lexer = MiniCLexer(InputStream(text))
+        tree = MiniCParser(CommonTokenStream(lexer)).prog()
+        stream = io.StringIO()
+        with pytest.raises(MiniCRuntimeError):
+            MiniCInterpretVisitor(OutputChannel(stream)).visit(tree)
+        assert stream.getvalue() == "42\n"
+
+
+if __name__ == '__main__':
+    pytest.main(sys.argv)